@@ -0,0 +1,158 @@
+"""Finite-state automaton over primitives that accepts structurally valid tracks.
+
+The state is the set of sounds in the beat currently being built, as a mask
+over the drum sound registry. A sound adds its bit, and is invalid if the
+beat already has it or already holds MAX_HITS sounds. A note length closes
+the beat, which requires at least one hit. A track is valid if it ends on a
+note length, i.e. in state 0. This is exactly what primitives_to_track and
+parse_track_from_drum_lang check, but it can be evaluated one primitive at
+a time so invalid fills are rejected before a track string is ever built.
+"""
+
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, Iterator, Optional, Sequence, Tuple
+
+from primitives import MAX_HITS, NoteLength, Primitive, PrimitiveType, sound_bits
+
+State = int
+START: State = 0
+
+# What a hole context needs to know about a state: its number of hits and
+# whether one of them is also among the sounds the suffix adds to the beat
+Shape = Tuple[int, bool]
+SHAPES: Tuple[Shape, ...] = tuple(
+    (hits, clash) for hits in range(MAX_HITS + 1) for clash in (False, True)
+)
+
+
+def step_sound(state: Optional[State], sound: Primitive) -> Optional[State]:
+    bit = sound_bits[sound.drum_lang_code]
+    if state is None or state & bit or state.bit_count() >= MAX_HITS:
+        return None
+    return state | bit
+
+
+def step_length(state: Optional[State]) -> Optional[State]:
+    if not state:
+        return None
+    return START
+
+
+def step(state: Optional[State], primitive: Primitive) -> Optional[State]:
+    """Next state, or None if the primitive makes the track invalid"""
+    if isinstance(primitive, NoteLength):
+        return step_length(state)
+    return step_sound(state, primitive)
+
+
+def run(state: Optional[State], primitives: Iterable[Primitive]) -> Optional[State]:
+    for primitive in primitives:
+        state = step(state, primitive)
+        if state is None:
+            return None
+    return state
+
+
+def accepts(primitives: Iterable[Primitive]) -> bool:
+    return run(START, primitives) == START
+
+
+def shape_successors(
+    shape: Shape, head_size: int
+) -> Iterator[Tuple[PrimitiveType, Shape]]:
+    """Kinds of primitive that can follow a state of this shape, with the
+    shape they lead to. There are more sounds than a beat holds, so a sound
+    that is neither in the beat nor added by the suffix is always available.
+    """
+    hits, clash = shape
+    if hits:
+        yield PrimitiveType.LENGTH, (0, False)
+    if hits < MAX_HITS:
+        yield PrimitiveType.SOUND, (hits + 1, clash)
+        if head_size:
+            yield PrimitiveType.SOUND, (hits + 1, True)
+
+
+@dataclass(frozen=True)
+class HoleContext:
+    """Automaton view of the primitives around a hole.
+
+    entry: state after the prefix, None if the prefix is already invalid
+    head: mask of the sounds the suffix adds to the beat the hole ends in
+    viable: viable[j] holds the shapes of the states from which j more hole
+        primitives of any kind can still reach a state the suffix accepts.
+        viable[0] holds the shapes of the live states after the hole.
+    """
+
+    entry: Optional[State]
+    head: State
+    viable: Tuple[FrozenSet[Shape], ...]
+
+    @classmethod
+    def from_track(
+        cls, track: Sequence[Primitive], hole_start: int, hole_length: int
+    ) -> "HoleContext":
+        entry = run(START, track[:hole_start])
+        head, live = cls._live(track[hole_start + hole_length :])
+        viable = [live]
+        for _ in range(hole_length - 1):
+            # Any primitive may go in a later hole position, so a shape is
+            # viable if one of its successors is viable with one fewer left
+            viable.append(
+                frozenset(
+                    shape
+                    for shape in SHAPES
+                    if any(
+                        nxt in viable[-1]
+                        for _, nxt in shape_successors(shape, head.bit_count())
+                    )
+                )
+            )
+        return cls(entry=entry, head=head, viable=tuple(viable))
+
+    @staticmethod
+    def _live(suffix: Sequence[Primitive]) -> Tuple[State, FrozenSet[Shape]]:
+        """Head of the suffix and the shapes from which it is accepted.
+
+        A state is live if the suffix's first beat, completed with the
+        state's sounds, has no repeated sound and at most MAX_HITS hits, and
+        the rest of the suffix is valid on its own.
+        """
+        if not suffix:
+            return START, frozenset({(0, False)})
+        resync = next(
+            (i for i, p in enumerate(suffix) if isinstance(p, NoteLength)), None
+        )
+        if resync is None:
+            return START, frozenset()
+        head = run(START, suffix[:resync])
+        if head is None or not accepts(suffix[resync + 1 :]):
+            return START, frozenset()
+        size = head.bit_count()
+        live = frozenset(
+            (hits, False) for hits in range(MAX_HITS + 1 - size) if hits + size
+        )
+        return head, live
+
+    @property
+    def hole_length(self) -> int:
+        return len(self.viable)
+
+    def shape(self, state: State) -> Shape:
+        return state.bit_count(), bool(state & self.head)
+
+    def allows(self, primitive: Primitive, filled: Sequence[Primitive] = ()) -> bool:
+        """Whether `primitive` can go in the hole after the `filled` primitives
+        while leaving the rest of the hole completable"""
+        state = step(run(self.entry, filled), primitive)
+        remaining = self.hole_length - len(filled) - 1
+        return (
+            state is not None
+            and remaining >= 0
+            and self.shape(state) in self.viable[remaining]
+        )
+
+    def accepts(self, fill: Sequence[Primitive]) -> bool:
+        """Whether the track is valid with the hole replaced by `fill`"""
+        state = run(self.entry, fill)
+        return state is not None and self.shape(state) in self.viable[0]
@@ -0,0 +1,323 @@
+"""Benchmarks for the parse, task generation, enumeration and render hot paths.
+
+Run from src/:
+
+    python bench.py
+    python bench.py --baseline other.json --threshold 0.2
+    python bench.py --out bench_baseline.json
+
+Results are compared against bench_baseline.json, or the file passed with
+--baseline. Any benchmark whose median time per run grew by more than the
+threshold is reported as a regression and the script exits with status 1.
+A missing baseline is an error, exit status 2. The committed baseline was
+measured on one machine, so first regenerate it on yours with --out
+before comparing. Writing to the baseline file skips the comparison.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from drum_lang import parse_primitives_from_drum_lang, parse_track_from_drum_lang
+from primitives import (
+    PlayableTrack,
+    PrimitiveType,
+    drum_lang_primitives,
+    drum_sounds,
+    note_lengths,
+)
+
+DEFAULT_BASELINE = Path(__file__).with_name("bench_baseline.json")
+
+# A workload returns the function to time and the number of work units one
+# call processes, used to report throughput.
+Workload = Callable[[], Tuple[Callable[[], object], int]]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Workload
+    repeat: int = 5
+
+
+benchmarks: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, repeat: int = 5):
+    def register(setup: Workload) -> Workload:
+        benchmarks[name] = Benchmark(name, setup, repeat)
+        return setup
+
+    return register
+
+
+def synthetic_drum_lang(num_beats: int, seed: int = 0) -> str:
+    """A random but valid drum lang string with 1-3 hits per beat"""
+    rng = random.Random(seed)
+    sounds = [s.drum_lang_code for s in drum_sounds.values()]
+    lengths = [length.drum_lang_code for length in note_lengths.values()]
+    return "".join(
+        "".join(rng.sample(sounds, rng.randint(1, 3))) + rng.choice(lengths)
+        for _ in range(num_beats)
+    )
+
+
+def synthetic_tracks(num_tracks: int, num_beats: int = 64) -> List[PlayableTrack]:
+    return [
+        parse_track_from_drum_lang(synthetic_drum_lang(num_beats, seed=i))
+        for i in range(num_tracks)
+    ]
+
+
+def corpus_tracks(
+    gp_dir: Path = Path(__file__).parent.parent / "data/gp",
+) -> List[PlayableTrack]:
+    """Tracks from the Guitar Pro corpus, empty if it cannot be loaded"""
+    from dataset import init_drum_dataset, load_tracks
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return load_tracks(init_drum_dataset(gp_dir))
+    except ImportError:
+        return []
+
+
+def quiet(fn: Callable[[], object]) -> Callable[[], object]:
+    """Drop the progress output of the wrapped call, it would dominate timings"""
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+
+    return run
+
+
+@benchmark("parse_track")
+def bench_parse_track():
+    sequence = synthetic_drum_lang(2000)
+    return lambda: parse_track_from_drum_lang(sequence), 2000
+
+
+@benchmark("parse_primitives")
+def bench_parse_primitives():
+    sequence = synthetic_drum_lang(2000)
+    return lambda: parse_primitives_from_drum_lang(sequence), len(sequence)
+
+
+@benchmark("generate_tasks_synthetic")
+def bench_generate_tasks_synthetic():
+    from dataset import generate_tasks_from_tracks
+
+    tracks = synthetic_tracks(50)
+
+    def run():
+        random.seed(0)
+        return generate_tasks_from_tracks(tracks, max_tasks=10**9)
+
+    return quiet(run), len(tracks)
+
+
+@benchmark("generate_tasks_corpus")
+def bench_generate_tasks_corpus():
+    from dataset import generate_tasks_from_tracks
+
+    tracks = corpus_tracks()
+    if not tracks:
+        return None
+
+    def run():
+        random.seed(0)
+        return generate_tasks_from_tracks(tracks, max_tasks=10**9)
+
+    return quiet(run), len(tracks)
+
+
+@benchmark("get_candidates")
+def bench_get_candidates():
+    from grammar import Grammar
+
+    grammar = Grammar.uniform(drum_lang_primitives)
+
+    def run():
+        for _ in range(100):
+            grammar.get_candidates(PrimitiveType.SOUND)
+            grammar.get_candidates(PrimitiveType.LENGTH)
+
+    return run, 200
+
+
+@benchmark("fill_holes")
+def bench_fill_holes():
+    from grammar import Grammar
+
+    grammar = Grammar.uniform(drum_lang_primitives)
+
+    def run():
+        for _ in range(100):
+            grammar.fill_holes(PrimitiveType.SOUND)
+            grammar.fill_holes(PrimitiveType.LENGTH)
+
+    return run, 200
+
+
+@benchmark("generate_tracks", repeat=3)
+def bench_generate_tracks():
+    from dataset import generate_tasks_from_tracks
+    from generator import generate_tracks
+    from grammar import Grammar
+
+    random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tasks = generate_tasks_from_tracks(synthetic_tracks(50), max_tasks=500)
+    tasks = [t for t in tasks if t.hole_type == PrimitiveType.SOUND]
+    grammar = Grammar.uniform(drum_lang_primitives)
+    run = quiet(lambda: generate_tracks(grammar, tasks, timeout_seconds=60))
+    return run, len(tasks)
+
+
+@benchmark("infill_engine")
+def bench_infill_engine():
+    """Uncached infill queries against a warm engine"""
+    from server import InfillEngine
+
+    engine = InfillEngine(result_cache_size=0).warm()
+    queries = [
+        synthetic_drum_lang(8) + "?" * length + "h3" for length in range(1, 5)
+    ]
+
+    def run():
+        for query in queries * 25:
+            engine.infill(query)
+
+    return run, 100
+
+
+@benchmark("render_timeline")
+def bench_render_timeline():
+    from scheduler import beat_offsets
+
+    track = parse_track_from_drum_lang(synthetic_drum_lang(5000))
+    return lambda: beat_offsets(track), len(track)
+
+
+@benchmark("render_realtime", repeat=3)
+def bench_render_realtime():
+    """Runs the real-time scheduler with a no-op trigger at an extreme tempo"""
+    from scheduler import PlaybackScheduler
+
+    track = parse_track_from_drum_lang(synthetic_drum_lang(200))
+    # 200 beats in well under a second
+    track.bpm = 100000
+    scheduler = PlaybackScheduler(lambda beat: None)
+    return lambda: scheduler.play(track), len(track)
+
+
+def run_benchmark(bench: Benchmark) -> Optional[dict]:
+    workload = bench.setup()
+    if workload is None:
+        return None
+    fn, units = workload
+    fn()  # warm up
+    times = []
+    for _ in range(bench.repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "median": median,
+        "min": min(times),
+        "repeat": bench.repeat,
+        "units": units,
+        "units_per_sec": units / median if median > 0 else float("inf"),
+    }
+
+
+def run_benchmarks(names: Optional[List[str]] = None) -> dict:
+    results = {}
+    for name, bench in benchmarks.items():
+        if names and not any(n in name for n in names):
+            continue
+        result = run_benchmark(bench)
+        if result is None:
+            print(f"{name:<28} skipped (workload unavailable)")
+            continue
+        results[name] = result
+        print(
+            f"{name:<28} {result['median'] * 1000:10.3f} ms"
+            f" {result['units_per_sec']:14.1f} units/s"
+        )
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> List[str]:
+    """Names of benchmarks whose median slowed down by more than `threshold`"""
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<28} not in baseline")
+            continue
+        change = result["median"] / base["median"] - 1
+        if change > threshold:
+            regressions.append(name)
+        print(f"{name:<28} {change * 100:+8.1f}% vs baseline")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", help="Only run benchmarks matching")
+    parser.add_argument("--out", type=Path, help="Save results as JSON")
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help="Compare against these results",
+    )
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    writing_baseline = args.out is not None and args.out.resolve() == (
+        args.baseline.resolve()
+    )
+    if not writing_baseline and not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}, create one with "
+            f"`python bench.py --out {args.baseline}`",
+            file=sys.stderr,
+        )
+        return 2
+
+    results = run_benchmarks(args.names)
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+    if writing_baseline:
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
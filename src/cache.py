@@ -0,0 +1,128 @@
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, FrozenSet, List, Optional, Sequence
+
+from automaton import HoleContext, Shape
+from grammar import Grammar, Production
+from metrics import NULL_METRICS, Metrics
+from primitives import Primitive, PrimitiveType, primitives_by_code
+
+
+def _shapes(shapes: FrozenSet[Shape]) -> str:
+    return "".join(f"{hits}{'x' if clash else '-'}" for hits, clash in sorted(shapes))
+
+
+def enumeration_key(
+    grammar: Grammar,
+    request: PrimitiveType,
+    contexts: Optional[Sequence[HoleContext]] = None,
+    previous: Optional[Primitive] = None,
+    lower_bound: float = 0,
+    upper_bound: float = 100,
+) -> str:
+    """Key identifying the result of one Grammar.fill_holes call.
+
+    Made of the grammar's content hash, the request type, the hole shape
+    (the distinct automaton contexts of the holes, plus the previous
+    primitive for contextual grammars) and the cost slice.
+    """
+    shape = "*"
+    if contexts is not None:
+        shape = ",".join(
+            sorted(
+                f"{c.entry}/{c.head}/" + "/".join(map(_shapes, c.viable))
+                for c in set(contexts)
+            )
+        )
+    parts = [
+        grammar.content_hash(),
+        request.name,
+        shape,
+        previous.drum_lang_code if previous is not None else "",
+        repr(lower_bound),
+        repr(upper_bound),
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+class EnumerationCache:
+    """Bounded LRU cache of enumeration results with an optional disk tier.
+
+    Entries evicted from memory stay on disk when `directory` is set, and
+    disk entries are promoted back into memory when read. Hits and misses
+    are counted locally and in `metrics`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        directory: Optional[Path] = None,
+        metrics: Metrics = NULL_METRICS,
+    ):
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory is not None else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.metrics = metrics
+        self.entries: "OrderedDict[str, List[Production]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries or (
+            self.directory is not None and self._path(key).exists()
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[Production]]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.metrics.inc("enumeration_cache_hits")
+            return self.entries[key]
+        if self.directory is not None and self._path(key).exists():
+            data = json.loads(self._path(key).read_text())
+            value = [(mdl, primitives_by_code[code]) for mdl, code in data]
+            self._remember(key, value)
+            self.disk_hits += 1
+            self.metrics.inc("enumeration_cache_disk_hits")
+            return value
+        self.misses += 1
+        self.metrics.inc("enumeration_cache_misses")
+        return None
+
+    def put(self, key: str, value: List[Production]):
+        self._remember(key, value)
+        if self.directory is not None:
+            data = [(mdl, p.drum_lang_code) for mdl, p in value]
+            self._path(key).write_text(json.dumps(data))
+
+    def _remember(self, key: str, value: List[Production]):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.metrics.inc("enumeration_cache_evictions")
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], List[Production]]
+    ) -> List[Production]:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
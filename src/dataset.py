@@ -1,10 +1,14 @@
+from functools import cached_property
+import hashlib
+from itertools import islice
 from pathlib import Path
 import random
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
+from automaton import HoleContext, accepts
+from dedup import RollingHash, SegmentDeduplicator
 from drum_lang import parse_primitives_from_drum_lang, parse_track_from_drum_lang
-from drum_synth import DrumSynth
-from tab_parser import parse_playable_track_from_tab
 from dataclasses import dataclass
+from metrics import NULL_METRICS, Metrics
 from primitives import (
     DrumSound,
     FlatTrack,
@@ -12,8 +16,10 @@ from primitives import (
     InfillTrack,
     Hole,
     PlayableTrack,
+    Primitive,
     PrimitiveType,
     Rest,
+    to_code_array,
 )
 
 
@@ -24,6 +30,7 @@ class InfillTask:
     original_track: InfillTrack
     hole_start: int  # Start index of hole
     hole_length: int  # Number of consecutive primitives to hole
+    weight: int = 1  # Occurrences of the track in the corpus after dedup
 
     @property
     def hole_indices(self) -> List[int]:
@@ -60,6 +67,9 @@ class InfillTask:
         return parse_track_from_drum_lang(self.to_drum_lang_string(with_hole))
 
     def play(self, with_hole: bool = False):
+        # Imported here so the dataset can be used without pygame installed
+        from drum_synth import DrumSynth
+
         track = self.to_playable_track(with_hole)
         track.bpm = 120
         synth = DrumSynth()
@@ -73,39 +83,103 @@ class InfillTask:
             f"_hole{self.hole_start}-{self.hole_start + self.hole_length}"
         )
 
+    @property
+    def task_id(self) -> str:
+        """Short id derived from the signature, stable across dataset refreshes"""
+        return hashlib.blake2b(self.task_signature.encode(), digest_size=8).hexdigest()
+
+    @cached_property
+    def hole_context(self) -> HoleContext:
+        """Automaton state around the hole, used to prune invalid fills"""
+        return HoleContext.from_track(
+            self.original_track, self.hole_start, self.hole_length
+        )
+
+    @property
+    def previous_primitive(self) -> Optional[Primitive]:
+        """The primitive right before the hole, None at the start of a track"""
+        if self.hole_start == 0:
+            return None
+        return self.original_track[self.hole_start - 1]
+
     @property
     def hole_type(self) -> PrimitiveType:
         """Get the type of the infill primitive"""
         return self.original_track[self.hole_start].type
 
 
+def task_to_dict(task: InfillTask) -> dict:
+    return {
+        "track": task.to_drum_lang_string(),
+        "hole_start": task.hole_start,
+        "hole_length": task.hole_length,
+        "weight": task.weight,
+    }
+
+
+def task_from_dict(data: dict) -> InfillTask:
+    return InfillTask(
+        original_track=parse_primitives_from_drum_lang(data["track"]),
+        hole_start=data["hole_start"],
+        hole_length=data["hole_length"],
+        weight=data.get("weight", 1),
+    )
+
+
+MIDI_SUFFIXES = (".mid", ".midi")
+
+
 def init_drum_dataset(gp_dir: str = "./data/gp"):
+    """Guitar Pro and MIDI files in `gp_dir`"""
     gp_dir = Path(gp_dir)
-    return list(gp_dir.glob("*.gp*"))
+    return sorted(
+        path
+        for path in gp_dir.glob("*")
+        if path.suffix.lower().startswith(".gp")
+        or path.suffix.lower() in MIDI_SUFFIXES
+    )
 
 
-def load_tracks(tab_files: List[Path]) -> List[PlayableTrack]:
-    """Load all drum tracks from Guitar Pro files in directory"""
-    tracks: List[PlayableTrack] = []
+def load_track(file_path: Path) -> PlayableTrack:
+    """Load the drum track of a Guitar Pro or MIDI file"""
+    if Path(file_path).suffix.lower() in MIDI_SUFFIXES:
+        from midi_parser import parse_playable_track_from_midi
+
+        return parse_playable_track_from_midi(file_path)
+
+    # Only needed when reading tabs, tasks can be used without guitarpro
+    from tab_parser import parse_playable_track_from_tab
+
+    return parse_playable_track_from_tab(file_path)
+
+
+def iter_tracks(tab_files: Iterable[Path]) -> Iterator[PlayableTrack]:
+    """Load drum tracks one file at a time, skipping files that fail"""
     for tab_file in tab_files:
         try:
-            track = parse_playable_track_from_tab(tab_file)
+            track = load_track(tab_file)
             if track:  # Only add non-empty tracks
-                tracks.append(track)
+                yield track
         except Exception as e:
             print(f"Error loading {tab_file}: {e}")
-    return tracks
+
+
+def load_tracks(tab_files: List[Path]) -> List[PlayableTrack]:
+    """Load all drum tracks from Guitar Pro and MIDI files"""
+    return list(iter_tracks(tab_files))
 
 
 def create_infill_task(
     track: FlatTrack,
     hole_length: int,
+    weight: int = 1,
 ) -> InfillTask:
     """Create an infill task from a track by hiding a sequence of primitives
 
     Args:
         track: The track to create a task from
         hole_length: Number of consecutive primitives to hole
+        weight: How many times the track occurs in the corpus
 
     Returns:
         InfillTask with a single hole of specified length
@@ -125,6 +199,7 @@ def create_infill_task(
         original_track=track,
         hole_start=hole_start,
         hole_length=hole_length,
+        weight=weight,
     )
 
 
@@ -134,6 +209,10 @@ def generate_tasks(
     min_beats: int = 12,
     max_beats: int = 24,
     hole_length: int = 1,
+    metrics: Metrics = NULL_METRICS,
+    dedup: Optional[str] = None,
+    dedup_threshold: float = 0.9,
+    align_measures: bool = False,
 ) -> List[InfillTask]:
     """Generate a dataset of infill tasks
 
@@ -143,44 +222,194 @@ def generate_tasks(
         min_beats: Minimum number of beats in a segment
         max_beats: Maximum number of beats in a segment
         hole_length: Number of consecutive primitives to hole in each task
+        metrics: Records counts and phase timings when enabled
+        dedup: None, "exact" to collapse identical segments, or "minhash" to
+            also collapse segments at least `dedup_threshold` similar. Kept
+            segments carry their multiplicity as the task weight.
+        dedup_threshold: Estimated Jaccard similarity for "minhash"
+        align_measures: Extend every segment to the next measure boundary so
+            segments start and end on whole measures
     """
-    all_tracks = load_tracks(tab_files)
+    with metrics.phase("load_tracks"):
+        all_tracks = load_tracks(tab_files)
     print(f"all_tracks: {len(all_tracks)}")
-    tasks = []
-    seen_signatures = set()
+    return generate_tasks_from_tracks(
+        all_tracks,
+        max_tasks,
+        min_beats=min_beats,
+        max_beats=max_beats,
+        hole_length=hole_length,
+        metrics=metrics,
+        dedup=dedup,
+        dedup_threshold=dedup_threshold,
+        align_measures=align_measures,
+    )
+
+
+def generate_tasks_from_tracks(
+    all_tracks: List[PlayableTrack],
+    max_tasks: int,
+    min_beats: int = 12,
+    max_beats: int = 24,
+    hole_length: int = 1,
+    metrics: Metrics = NULL_METRICS,
+    dedup: Optional[str] = None,
+    dedup_threshold: float = 0.9,
+    align_measures: bool = False,
+) -> List[InfillTask]:
+    """Generate infill tasks from already loaded tracks, see generate_tasks"""
+    with metrics.phase("generate_tasks"):
+        tasks = _generate_tasks(
+            all_tracks,
+            max_tasks,
+            min_beats,
+            max_beats,
+            hole_length,
+            metrics,
+            dedup=dedup,
+            dedup_threshold=dedup_threshold,
+            align_measures=align_measures,
+        )
+
+    metrics.inc("tracks_processed", len(all_tracks))
+    metrics.inc("tasks_generated", len(tasks))
+    print("-" * 25)
+    print(f"Dataset statistics:")
+    print(f"Total tracks processed: {len(all_tracks)}")
+    print(f"Tasks generated: {len(tasks)}")
+    print("-" * 25)
 
+    return tasks
+
+
+def _iter_segments(
+    all_tracks: Iterable[PlayableTrack],
+    min_beats: int,
+    max_beats: int,
+    metrics: Metrics,
+    fingerprints: bool = False,
+    align_measures: bool = False,
+) -> Iterator[Tuple[FlatTrack, Optional[int]]]:
+    """Yield valid random-length segments of each track.
+
+    With fingerprints=True each segment comes with its Rabin-Karp hash, read
+    in O(1) from prefix hashes computed once over the track's code array.
+    With align_measures=True each segment runs on to the next measure start
+    of the track's tick grid.
+    """
     for track in all_tracks:
+        flat = parse_primitives_from_drum_lang(track.to_drum_lang_sequence())
+        # Index in `flat` where each beat starts
+        offsets = [0]
+        for beat in track.beats:
+            # A beat built directly may repeat a hit, the canonical drum lang drops it
+            offsets.append(offsets[-1] + len(beat.chord.hits) + 1)
+        hashes = RollingHash(to_code_array(flat)) if fingerprints else None
+        grid = track.tick_grid() if align_measures else None
+
         i = 0
         while i < len(track):
             # Find end of segment
             random_len = random.randint(min_beats, max_beats)
             end = min(i + random_len, len(track))
-            segment = track.from_slice(i, end)
-            segment = parse_primitives_from_drum_lang(segment.to_drum_lang_sequence())
+            if grid is not None:
+                end = grid.next_measure_start(end)
+            segment = flat[offsets[i] : offsets[end]]
 
+            metrics.inc("segments_total")
             if is_valid_segment(segment, min_beats=random_len):
-                for _ in range(5):
-                    task = create_infill_task(segment, hole_length=hole_length)
-                    if task.task_signature not in seen_signatures:
-                        seen_signatures.add(task.task_signature)
-                        tasks.append(task)
-                        if len(tasks) >= max_tasks:
-                            break
-            if len(tasks) >= max_tasks:
-                break
-
+                yield segment, hashes(offsets[i], offsets[end]) if hashes else None
+            else:
+                metrics.inc("invalid_segments")
             i = end
 
-        if len(tasks) >= max_tasks:
-            break
 
-    print("-" * 25)
-    print(f"Dataset statistics:")
-    print(f"Total tracks processed: {len(all_tracks)}")
-    print(f"Tasks generated: {len(tasks)}")
-    print("-" * 25)
+def _generate_tasks(
+    all_tracks: List[PlayableTrack],
+    max_tasks: int,
+    min_beats: int,
+    max_beats: int,
+    hole_length: int,
+    metrics: Metrics,
+    dedup: Optional[str] = None,
+    dedup_threshold: float = 0.9,
+    align_measures: bool = False,
+) -> List[InfillTask]:
+    if dedup not in (None, "exact", "minhash"):
+        raise ValueError(f"Unknown dedup mode: {dedup}")
+
+    segments = _iter_segments(
+        all_tracks,
+        min_beats,
+        max_beats,
+        metrics,
+        fingerprints=bool(dedup),
+        align_measures=align_measures,
+    )
+    if dedup:
+        # One pass over the whole corpus, then one task set per distinct
+        # segment weighted by how often it occurs
+        deduplicator = SegmentDeduplicator(
+            near_duplicates=dedup == "minhash", threshold=dedup_threshold
+        )
+        total = 0
+        for segment, fingerprint in segments:
+            deduplicator.add(segment, to_code_array(segment), fingerprint)
+            total += 1
+        metrics.inc("duplicate_segments", total - len(deduplicator))
+        weighted = deduplicator.items()
+    else:
+        weighted = ((segment, 1) for segment, _ in segments)
 
-    return tasks
+    return list(islice(_tasks_from_segments(weighted, hole_length, metrics), max_tasks))
+
+
+def _tasks_from_segments(
+    weighted: Iterable[Tuple[FlatTrack, int]],
+    hole_length: int,
+    metrics: Metrics,
+    compact_signatures: bool = False,
+) -> Iterator[InfillTask]:
+    """Up to 5 tasks with distinct holes per segment.
+
+    With compact_signatures=True only an 8 byte digest of every signature is
+    kept for deduplication instead of the full signature string.
+    """
+    seen_signatures = set()
+    for segment, weight in weighted:
+        for _ in range(5):
+            task = create_infill_task(segment, hole_length=hole_length, weight=weight)
+            signature = task.task_signature
+            if compact_signatures:
+                signature = hashlib.blake2b(signature.encode(), digest_size=8).digest()
+            if signature not in seen_signatures:
+                seen_signatures.add(signature)
+                yield task
+            else:
+                metrics.inc("duplicate_tasks")
+
+
+def iter_tasks(
+    tracks: Iterable[PlayableTrack],
+    min_beats: int = 12,
+    max_beats: int = 24,
+    hole_length: int = 1,
+    metrics: Metrics = NULL_METRICS,
+    align_measures: bool = False,
+) -> Iterator[InfillTask]:
+    """Stream tasks from a stream of tracks, see generate_tasks.
+
+    Neither the tracks nor the tasks are kept, and task signatures are
+    deduplicated through compact digests, so memory stays flat on large
+    corpora.
+    """
+    segments = _iter_segments(
+        tracks, min_beats, max_beats, metrics, align_measures=align_measures
+    )
+    weighted = ((segment, 1) for segment, _ in segments)
+    yield from _tasks_from_segments(
+        weighted, hole_length, metrics, compact_signatures=True
+    )
 
 
 def is_valid_segment(segment: FlatTrack, min_beats: int = 4) -> bool:
@@ -198,6 +427,10 @@ def is_valid_segment(segment: FlatTrack, min_beats: int = 4) -> bool:
         if not isinstance(segment[-1], NoteLength):
             return False
 
+        # The parser has no hit limit, the automaton rejects crowded beats
+        if not accepts(segment):
+            return False
+
         # Convert to drum lang and check number of beats
         drum_lang = "".join(primitive.drum_lang_code for primitive in segment)
         playable_track = parse_track_from_drum_lang(drum_lang)
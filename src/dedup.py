@@ -0,0 +1,170 @@
+"""Content-addressed deduplication of track segments.
+
+Segments are compared by their code arrays (see primitives.to_code_array).
+Exact duplicates are found with a Rabin-Karp polynomial hash: prefix hashes
+are computed once per track, after which the hash of any segment is O(1).
+Near duplicates are optionally found with MinHash signatures over rolling
+k-gram shingles, bucketed with locality-sensitive hashing so the whole
+corpus is processed in a single near-linear pass.
+"""
+
+import random
+from typing import Dict, Generic, Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+# Mersenne prime modulus and a fixed base, so hashes are stable across runs
+MOD = (1 << 61) - 1
+BASE = 1_000_003
+
+Key = TypeVar("Key")
+
+
+class RollingHash:
+    """Prefix hashes of a code array, giving O(1) hashes of any slice"""
+
+    def __init__(self, codes: Sequence[int]):
+        self.prefix = [0] * (len(codes) + 1)
+        self.powers = [1] * (len(codes) + 1)
+        for i, code in enumerate(codes):
+            # +1 so that code 0 still contributes to the hash
+            self.prefix[i + 1] = (self.prefix[i] * BASE + code + 1) % MOD
+            self.powers[i + 1] = (self.powers[i] * BASE) % MOD
+
+    def __len__(self) -> int:
+        return len(self.prefix) - 1
+
+    def __call__(self, start: int = 0, end: Optional[int] = None) -> int:
+        if end is None:
+            end = len(self)
+        return (self.prefix[end] - self.prefix[start] * self.powers[end - start]) % MOD
+
+
+def shingles(codes: Sequence[int], k: int) -> List[int]:
+    """Hashes of every k-gram of `codes`, computed with a sliding window"""
+    if len(codes) < k:
+        return [RollingHash(codes)()] if codes else []
+    top = pow(BASE, k - 1, MOD)
+    h = 0
+    for code in codes[:k]:
+        h = (h * BASE + code + 1) % MOD
+    hashes = [h]
+    for i in range(k, len(codes)):
+        h = ((h - (codes[i - k] + 1) * top) * BASE + codes[i] + 1) % MOD
+        hashes.append(h)
+    return hashes
+
+
+class MinHasher:
+    """MinHash signatures using `num_perm` universal hash functions"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 4, seed: int = 0):
+        rng = random.Random(seed)
+        self.shingle_size = shingle_size
+        self.params = [
+            (rng.randrange(1, MOD), rng.randrange(0, MOD)) for _ in range(num_perm)
+        ]
+
+    def signature(self, codes: Sequence[int]) -> Tuple[int, ...]:
+        hashes = set(shingles(codes, self.shingle_size))
+        if not hashes:
+            return tuple(MOD for _ in self.params)
+        return tuple(min((a * h + b) % MOD for h in hashes) for a, b in self.params)
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) whose LSH S-curve has its midpoint closest to `threshold`"""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if best is None or abs(midpoint - threshold) < best[0]:
+            best = (abs(midpoint - threshold), bands, rows)
+    return best[1], best[2]
+
+
+class SegmentDeduplicator(Generic[Key]):
+    """Collapses duplicate segments into representatives with weights.
+
+    Each added segment is either a new representative or counted towards an
+    existing one. With near_duplicates=True, segments whose estimated Jaccard
+    similarity to a representative is at least `threshold` are merged too.
+    """
+
+    def __init__(
+        self,
+        near_duplicates: bool = False,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        shingle_size: int = 4,
+    ):
+        self.representatives: List[Key] = []
+        self.weights: List[int] = []
+        self._exact: Dict[Tuple[int, int], List[Tuple[bytes, int]]] = {}
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        if near_duplicates:
+            self._hasher = MinHasher(num_perm, shingle_size)
+            self._bands, self._rows = lsh_bands(num_perm, threshold)
+            self._buckets: Dict[Hashable, List[int]] = {}
+            self._signatures: List[Tuple[int, ...]] = []
+
+    def __len__(self) -> int:
+        return len(self.representatives)
+
+    def add(
+        self, key: Key, codes: Sequence[int], fingerprint: Optional[int] = None
+    ) -> int:
+        """Add a segment, returning the index of its representative.
+
+        `fingerprint` is the segment's RollingHash value; pass it when it has
+        already been computed from the track's prefix hashes.
+        """
+        if fingerprint is None:
+            fingerprint = RollingHash(codes)()
+        content = bytes(codes)
+        exact = self._exact.setdefault((fingerprint, len(content)), [])
+        for other, index in exact:
+            if other == content:
+                self.weights[index] += 1
+                return index
+
+        if self.near_duplicates:
+            signature = self._hasher.signature(codes)
+            index = self._find_similar(signature)
+            if index is not None:
+                exact.append((content, index))
+                self.weights[index] += 1
+                return index
+
+        index = len(self.representatives)
+        self.representatives.append(key)
+        self.weights.append(1)
+        exact.append((content, index))
+        if self.near_duplicates:
+            self._signatures.append(signature)
+            for band in self._band_keys(signature):
+                self._buckets.setdefault(band, []).append(index)
+        return index
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        for b in range(self._bands):
+            yield b, signature[b * self._rows : (b + 1) * self._rows]
+
+    def _find_similar(self, signature: Tuple[int, ...]) -> Optional[int]:
+        seen = set()
+        for band in self._band_keys(signature):
+            for index in self._buckets.get(band, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                if similarity(signature, self._signatures[index]) >= self.threshold:
+                    return index
+        return None
+
+    def items(self) -> List[Tuple[Key, int]]:
+        """Representatives with their multiplicity"""
+        return list(zip(self.representatives, self.weights))
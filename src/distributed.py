@@ -0,0 +1,386 @@
+"""Coordinator/worker enumeration over TCP or Unix sockets.
+
+The coordinator splits tasks into jobs of (grammar, task batch, budget
+slice) and hands them to workers on request. Workers send heartbeats while
+they enumerate; a job whose worker disconnects or stops sending heartbeats
+is put back in the queue for another worker. Results stream back into the
+coordinator's frontiers as jobs finish.
+
+The protocol is one JSON object per line:
+
+    worker -> coordinator  {"type": "hello", "worker": id}
+                           {"type": "request"}
+                           {"type": "heartbeat"}
+                           {"type": "result", "job": id, "results": {...}}
+    coordinator -> worker  {"type": "job", "job": id, ...} in reply to request,
+                           or {"type": "wait"} / {"type": "done"}
+                           {"type": "error", "error": ...} in reply to a
+                           malformed message, or a request or result sent
+                           before hello
+
+Start workers with `python distributed.py HOST:PORT` or a socket path.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from dataset import InfillTask, task_from_dict, task_to_dict
+from frontier import Frontiers
+from generator import generate_tracks
+from grammar import ContextualGrammar, Grammar
+from primitives import primitives_by_code
+
+Address = Union[Tuple[str, int], str]
+
+
+def grammar_to_dict(grammar: Grammar) -> dict:
+    if isinstance(grammar, ContextualGrammar):
+        return {
+            "kind": "contextual",
+            "primitives": "".join(p.drum_lang_code for p in grammar.primitives),
+            "table": list(grammar.table),
+        }
+    return {
+        "kind": "unigram",
+        "productions": [[lp, p.drum_lang_code] for lp, p in grammar.productions],
+    }
+
+
+def grammar_from_dict(data: dict) -> Grammar:
+    if data["kind"] == "contextual":
+        primitives = [primitives_by_code[c] for c in data["primitives"]]
+        return ContextualGrammar(primitives, data["table"])
+    return Grammar([(lp, primitives_by_code[c]) for lp, c in data["productions"]])
+
+
+def _connect(address: Address) -> socket.socket:
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.connect(address)
+    return sock
+
+
+def _send(sock_file, message: dict, lock: Optional[threading.Lock] = None):
+    data = (json.dumps(message) + "\n").encode()
+    if lock is None:
+        sock_file.write(data)
+        sock_file.flush()
+        return
+    with lock:
+        sock_file.write(data)
+        sock_file.flush()
+
+
+@dataclass
+class Job:
+    id: str
+    grammar: dict
+    tasks: List[dict]
+    budget: dict
+    attempts: int = 0
+    worker: Optional[str] = None
+
+
+@dataclass
+class WorkerState:
+    id: str
+    last_seen: float
+    jobs: set = field(default_factory=set)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator: Coordinator = self.server.coordinator
+        worker = None
+        lock = threading.Lock()
+        try:
+            for line in self.rfile:
+                try:
+                    message = json.loads(line)
+                    if message["type"] == "hello":
+                        worker = message["worker"]
+                    reply = coordinator._handle(worker, message)
+                except (ValueError, KeyError, TypeError) as e:
+                    # A bad message is answered, the connection stays up
+                    reply = {"type": "error", "error": repr(e)}
+                if reply is not None:
+                    _send(self.wfile, reply, lock)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if worker is not None:
+                coordinator._drop_worker(worker)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator:
+    """Hands out enumeration jobs to workers and collects their frontiers"""
+
+    def __init__(
+        self,
+        address: Address = ("127.0.0.1", 0),
+        heartbeat_timeout: float = 10.0,
+        on_result: Optional[Callable[[str, Frontiers], None]] = None,
+    ):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.on_result = on_result
+        self.frontiers: Frontiers = {}
+        self._lock = threading.Condition()
+        self._pending: deque = deque()
+        self._jobs: Dict[str, Job] = {}
+        self._completed: set = set()
+        self._workers: Dict[str, WorkerState] = {}
+        self._closing = False
+
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            server_class = _UnixServer
+        else:
+            server_class = _TCPServer
+        self.server = server_class(address, _Handler)
+        self.server.coordinator = self
+        self.address: Address = self.server.server_address
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "Coordinator":
+        for target in (self.server.serve_forever, self._reap):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def shutdown(self):
+        with self._lock:
+            self._closing = True
+            self._lock.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def submit(
+        self,
+        grammar: Grammar,
+        tasks: List[InfillTask],
+        batch_size: int = 32,
+        upper_bound: float = 100,
+        timeout_seconds: float = 2,
+    ) -> List[str]:
+        """Queue tasks as jobs of at most `batch_size` tasks sharing a hole type"""
+        by_type: Dict[object, List[InfillTask]] = {}
+        for task in tasks:
+            by_type.setdefault(task.hole_type, []).append(task)
+
+        grammar_data = grammar_to_dict(grammar)
+        budget = {"upper_bound": upper_bound, "timeout_seconds": timeout_seconds}
+        job_ids = []
+        with self._lock:
+            for group in by_type.values():
+                for i in range(0, len(group), batch_size):
+                    job = Job(
+                        id=uuid.uuid4().hex,
+                        grammar=grammar_data,
+                        tasks=[task_to_dict(t) for t in group[i : i + batch_size]],
+                        budget=budget,
+                    )
+                    for task in group[i : i + batch_size]:
+                        self.frontiers.setdefault(task.task_signature, [])
+                    self._jobs[job.id] = job
+                    self._pending.append(job.id)
+                    job_ids.append(job.id)
+            self._lock.notify_all()
+        return job_ids
+
+    def wait(self, timeout: Optional[float] = None) -> Frontiers:
+        """Block until every submitted job has a result"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while len(self._completed) < len(self._jobs):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(
+                        f"{len(self._jobs) - len(self._completed)} jobs unfinished"
+                    )
+                self._lock.wait(remaining)
+            return self.frontiers
+
+    @property
+    def workers(self) -> List[str]:
+        with self._lock:
+            return list(self._workers)
+
+    def job(self, job_id: str) -> Job:
+        return self._jobs[job_id]
+
+    # Called from connection threads
+
+    def _handle(self, worker: Optional[str], message: dict) -> Optional[dict]:
+        kind = message["type"]
+        with self._lock:
+            if worker is not None:
+                state = self._workers.get(worker)
+                if state is None:
+                    state = self._workers[worker] = WorkerState(worker, 0.0)
+                state.last_seen = time.monotonic()
+            if kind in ("hello", "heartbeat"):
+                return None
+            if worker is None and kind in ("request", "result"):
+                raise ValueError(f"{kind} before hello")
+            if kind == "request":
+                if self._closing:
+                    return {"type": "done"}
+                if not self._pending:
+                    return {"type": "wait"}
+                job = self._jobs[self._pending.popleft()]
+                job.worker = worker
+                job.attempts += 1
+                self._workers[worker].jobs.add(job.id)
+                return {
+                    "type": "job",
+                    "job": job.id,
+                    "grammar": job.grammar,
+                    "tasks": job.tasks,
+                    "budget": job.budget,
+                }
+            if kind == "result":
+                job_id = message["job"]
+                results = message["results"]
+                if not isinstance(results, dict):
+                    raise ValueError("results must map task signatures to tracks")
+                if worker in self._workers:
+                    self._workers[worker].jobs.discard(job_id)
+                if job_id in self._completed or job_id not in self._jobs:
+                    # Late result of a job that was reassigned and finished
+                    return None
+                if job_id in self._pending:
+                    self._pending.remove(job_id)
+                self._completed.add(job_id)
+                for signature, tracks in results.items():
+                    self.frontiers.setdefault(signature, []).extend(
+                        (priority, track) for priority, track in tracks
+                    )
+                self._lock.notify_all()
+            else:
+                raise ValueError(f"Unknown message type: {kind}")
+        if self.on_result is not None:
+            self.on_result(job_id, results)
+        return None
+
+    def _drop_worker(self, worker: str):
+        """Requeue the unfinished jobs of a dead worker"""
+        with self._lock:
+            state = self._workers.pop(worker, None)
+            if state is None:
+                return
+            for job_id in state.jobs:
+                if job_id not in self._completed and job_id not in self._pending:
+                    self._jobs[job_id].worker = None
+                    self._pending.appendleft(job_id)
+            self._lock.notify_all()
+
+    def _reap(self):
+        while True:
+            with self._lock:
+                if self._closing:
+                    return
+                now = time.monotonic()
+                dead = [
+                    w.id
+                    for w in self._workers.values()
+                    if now - w.last_seen > self.heartbeat_timeout
+                ]
+            for worker in dead:
+                self._drop_worker(worker)
+            time.sleep(self.heartbeat_timeout / 4)
+
+
+def run_worker(
+    address: Address,
+    worker_id: Optional[str] = None,
+    heartbeat_interval: float = 1.0,
+    poll_interval: float = 0.05,
+    max_jobs: Optional[int] = None,
+):
+    """Request and run jobs until the coordinator says it is done"""
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    sock = _connect(address)
+    reader = sock.makefile("rb")
+    writer = sock.makefile("wb")
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(heartbeat_interval):
+            try:
+                _send(writer, {"type": "heartbeat"}, lock)
+            except OSError:
+                return
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    jobs_run = 0
+    try:
+        _send(writer, {"type": "hello", "worker": worker_id}, lock)
+        while max_jobs is None or jobs_run < max_jobs:
+            _send(writer, {"type": "request"}, lock)
+            line = reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message["type"] == "error":
+                raise ValueError(f"Coordinator error: {message['error']}")
+            if message["type"] == "done":
+                break
+            if message["type"] == "wait":
+                time.sleep(poll_interval)
+                continue
+            grammar = grammar_from_dict(message["grammar"])
+            tasks = [task_from_dict(t) for t in message["tasks"]]
+            results = generate_tracks(grammar, tasks, **message["budget"])
+            _send(
+                writer,
+                {"type": "result", "job": message["job"], "results": results},
+                lock,
+            )
+            jobs_run += 1
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        stopped.set()
+        sock.close()
+
+
+def parse_address(value: str) -> Address:
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an enumeration worker")
+    parser.add_argument("address", help="HOST:PORT or Unix socket path")
+    parser.add_argument("--heartbeat", type=float, default=1.0)
+    args = parser.parse_args()
+    run_worker(parse_address(args.address), heartbeat_interval=args.heartbeat)
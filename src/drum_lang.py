@@ -1,12 +1,17 @@
-from typing import List, Union
-from drum_synth import DrumSynth
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple, Union
 from primitives import (
+    MAX_HITS,
     Beat,
+    Chord,
     DrumSound,
     InfillTrack,
     NoteLength,
     Hole,
     PlayableTrack,
+    Rest,
+    length_ids,
+    sound_bits,
 )
 
 
@@ -42,20 +47,59 @@ def primitives_to_track(
         raise ValueError("Occlusions not supported in primitives_to_track")
 
     beats: List[Beat] = []
-    hits: List[DrumSound] = []
+    mask = 0
 
     for primitive in primitives:
-        if isinstance(primitive, DrumSound):
-            hits.append(primitive)
+        if isinstance(primitive, (DrumSound, Rest)):
+            bit = sound_bits[primitive.drum_lang_code]
+            if mask & bit:
+                raise ValueError(f"Repeated hit in a beat: {primitive}")
+            mask |= bit
         elif isinstance(primitive, NoteLength):
+            chord = Chord(mask, length_ids[primitive.drum_lang_code])
+            if not chord.mask:
+                raise ValueError("No hits to create a beat")
+            elif len(chord) > MAX_HITS:
+                raise ValueError(f"Too many hits to create a beat (max {MAX_HITS})")
+            beats.append(chord.to_beat())
+            mask = 0
+
+    return PlayableTrack(beats=beats, bpm=bpm)
+
+
+@dataclass(frozen=True)
+class ParseState:
+    """Resumable parser state: beats completed so far and the hits of the
+    beat being built. Lets a parse stop at any primitive and continue later,
+    e.g. once per candidate fill after a shared prefix."""
+
+    beat_count: int = 0
+    hits: Tuple[Union[DrumSound, Rest], ...] = ()
+
+
+def resume_parse(
+    state: ParseState,
+    primitives: Sequence[Union[DrumSound, Rest, NoteLength]],
+) -> Tuple[ParseState, List[Beat]]:
+    """Continue parsing from `state`, returning the new state and the beats
+    completed along the way. Raises ValueError on invalid beats."""
+    beats: List[Beat] = []
+    hits = list(state.hits)
+    for primitive in primitives:
+        if isinstance(primitive, NoteLength):
             if not hits:
                 raise ValueError("No hits to create a beat")
-            elif len(hits) > 4:
-                raise ValueError("Too many hits to create a beat (max 4)")
             beats.append(Beat(hits=hits, length=primitive))
             hits = []
-
-    return PlayableTrack(beats=beats, bpm=bpm)
+        elif isinstance(primitive, (DrumSound, Rest)):
+            if len(hits) == MAX_HITS:
+                raise ValueError(f"Too many hits to create a beat (max {MAX_HITS})")
+            if primitive in hits:
+                raise ValueError(f"Repeated hit in a beat: {primitive}")
+            hits.append(primitive)
+        else:
+            raise ValueError(f"Cannot parse {primitive}")
+    return ParseState(state.beat_count + len(beats), tuple(hits)), beats
 
 
 def parse_track_from_drum_lang(sequence: str) -> PlayableTrack:
@@ -79,6 +123,8 @@ def parse_track_from_drum_lang(sequence: str) -> PlayableTrack:
                 raise ValueError(f"Invalid or missing drum sound")
             elif drum_sound is None:
                 break
+            elif drum_sound in simultaneous_hits:
+                raise ValueError(f"Repeated hit in a beat: {drum_sound}")
             else:
                 simultaneous_hits.append(drum_sound)
                 i += 1
@@ -102,6 +148,8 @@ def parse_track_from_drum_lang(sequence: str) -> PlayableTrack:
 
 
 if __name__ == "__main__":
+    from drum_synth import DrumSynth
+
     sequence = "B2B2S2R2"  # Boom boom clap
     track = parse_track_from_drum_lang(sequence)
     track.bpm = 81
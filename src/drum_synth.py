@@ -2,7 +2,8 @@ import random
 import time
 import pygame
 import pygame.midi
-from primitives import DrumSound, PlayableTrack, drum_sounds
+from primitives import Beat, DrumSound, PlayableTrack, drum_sounds
+from scheduler import PlaybackScheduler
 
 
 class DrumSynth:
@@ -14,6 +15,7 @@ class DrumSynth:
         pygame.midi.init()
 
         # Load all drum sounds into memory
+        self.scheduler = None
         self.sounds = {}
         for drum_sound in drum_sounds.values():
             if isinstance(drum_sound, DrumSound) and drum_sound.sample_path.exists():
@@ -33,31 +35,28 @@ class DrumSynth:
             self.sounds[midi_value].set_volume(volume)
             self.sounds[midi_value].play()
 
-    def play_track(self, track: PlayableTrack):
-        for beat in track.beats:
-            seconds_per_beat = (
-                60.0 / track.bpm
-            )  # one beat (quarter note) duration in seconds
+    def play_beat(self, beat: Beat):
+        for hit in beat.hits:
+            if isinstance(hit, DrumSound):
+                self.play_drum(hit.midi_value)
 
-            for hit in beat.hits:
-                if isinstance(hit, DrumSound):
-                    self.play_drum(hit.midi_value)
+    def play_track(self, track: PlayableTrack, blocking: bool = True):
+        """Play a track in real time.
 
-            duration = 1 / beat.length.value
-            if beat.length.is_dotted:
-                duration = duration + (duration / 2)
-
-            # Convert duration to seconds based on BPM
-            duration = (
-                duration * 4 * seconds_per_beat
-            )  # scale by 4 since duration is 1/note_value
-
-            time.sleep(duration)
-
-        self.cleanup()
-
-    def cleanup(self):
-        """Clean up resources"""
-        time.sleep(1)
+        Hits are scheduled against an absolute timeline, so the track stays on
+        tempo however long it is. With blocking=False the returned scheduler
+        can be used to stop, seek or change tempo while the track plays.
+        """
+        self.scheduler = PlaybackScheduler(self.play_beat)
+        self.scheduler.play(track, blocking=blocking)
+        if blocking:
+            self.cleanup()
+        return self.scheduler
+
+    def cleanup(self, timeout: float = 5.0):
+        """Let ringing samples finish, then clean up resources"""
+        deadline = time.monotonic() + timeout
+        while pygame.mixer.get_busy() and time.monotonic() < deadline:
+            time.sleep(0.01)
         pygame.midi.quit()
         pygame.mixer.quit()
@@ -0,0 +1,185 @@
+"""Columnar export of tasks and frontiers as chunks of NPY files.
+
+Every chunk is a directory holding one fixed-dtype .npy file per column,
+written with the standard library only. A meta.json next to the chunks
+lists the columns, their dtypes and the primitive alphabet used by the
+code columns, so consumers need nothing from this project:
+
+    np.load("out/chunk_00000/codes.npy", mmap_mode="r")
+
+or, without numpy, `load_chunk` which maps the files and returns zero-copy
+memoryviews.
+
+Variable-length columns (codes, answer_codes) are stored flat with an
+offsets column of length rows + 1, Arrow style.
+"""
+
+import ast
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dataset import InfillTask
+from frontier import Frontiers
+from primitives import drum_lang_primitives, to_code_array
+
+
+# column -> (array typecode, numpy descr)
+COLUMNS: Dict[str, Tuple[str, str]] = {
+    "codes": ("B", "|u1"),
+    "code_offsets": ("q", "<i8"),
+    "hole_start": ("i", "<i4"),
+    "hole_length": ("i", "<i4"),
+    "weight": ("i", "<i4"),
+    "answer_codes": ("B", "|u1"),
+    "answer_offsets": ("q", "<i8"),
+    "num_solutions": ("i", "<i4"),
+    "prior": ("d", "<f8"),
+    "likelihood": ("d", "<f8"),
+}
+
+NPY_MAGIC = b"\x93NUMPY"
+
+
+def write_npy(path: Path, values: array, descr: str):
+    """Write a 1-d array as NPY format version 1.0"""
+    if values.itemsize > 1 and sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    header = repr(
+        {"descr": descr, "fortran_order": False, "shape": (len(values),)}
+    ).encode("latin1")
+    # Magic, version and header length take 10 bytes; pad to 64 bytes
+    padding = -(10 + len(header) + 1) % 64
+    header += b" " * padding + b"\n"
+    with open(path, "wb") as f:
+        f.write(NPY_MAGIC + b"\x01\x00" + struct.pack("<H", len(header)))
+        f.write(header)
+        values.tofile(f)
+
+
+def read_npy(path: Path, typecode: str) -> memoryview:
+    """Memory-map a 1-d NPY file written by write_npy without copying"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if bytes(view[:6]) != NPY_MAGIC:
+        raise ValueError(f"Not an NPY file: {path}")
+    (header_length,) = struct.unpack("<H", view[8:10])
+    header = ast.literal_eval(bytes(view[10 : 10 + header_length]).decode("latin1"))
+    if header["descr"][0] == ">" or (
+        header["descr"][0] == "<" and sys.byteorder != "little"
+    ):
+        raise ValueError("Byte order of the file does not match this machine")
+    return view[10 + header_length :].cast(typecode)
+
+
+def frontier_columns(
+    task: InfillTask, frontiers: Optional[Frontiers]
+) -> Tuple[int, float, float]:
+    """(num_solutions, prior, likelihood) of a task's best frontier entry.
+
+    A solution's priority is -(likelihood + mdl) with likelihood 0 for an
+    exact match, so its prior log probability equals its priority.
+    Unsolved tasks have a NaN prior and -inf likelihood.
+    """
+    solutions = frontiers.get(task.task_signature, []) if frontiers else []
+    if not solutions:
+        return 0, float("nan"), float("-inf")
+    best = max(priority for priority, _ in solutions)
+    return len(solutions), best, 0.0
+
+
+class ColumnarWriter:
+    """Writes tasks in chunks of at most `chunk_size` rows"""
+
+    def __init__(self, directory: Path, chunk_size: int = 65536):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.chunks: List[dict] = []
+        self._reset()
+
+    def _reset(self):
+        self.columns = {name: array(code) for name, (code, _) in COLUMNS.items()}
+        self.columns["code_offsets"].append(0)
+        self.columns["answer_offsets"].append(0)
+        self.rows = 0
+
+    def add(self, task: InfillTask, frontiers: Optional[Frontiers] = None):
+        columns = self.columns
+        codes = to_code_array(task.original_track)
+        columns["codes"].extend(codes)
+        columns["code_offsets"].append(len(columns["codes"]))
+        columns["hole_start"].append(task.hole_start)
+        columns["hole_length"].append(task.hole_length)
+        columns["weight"].append(task.weight)
+        answer = codes[task.hole_start : task.hole_start + len(task.hole_indices)]
+        columns["answer_codes"].extend(answer)
+        columns["answer_offsets"].append(len(columns["answer_codes"]))
+        num_solutions, prior, likelihood = frontier_columns(task, frontiers)
+        columns["num_solutions"].append(num_solutions)
+        columns["prior"].append(prior)
+        columns["likelihood"].append(likelihood)
+        self.rows += 1
+        if self.rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        name = f"chunk_{len(self.chunks):05d}"
+        chunk_dir = self.directory / name
+        chunk_dir.mkdir(exist_ok=True)
+        for column, values in self.columns.items():
+            write_npy(chunk_dir / f"{column}.npy", values, COLUMNS[column][1])
+        self.chunks.append({"name": name, "rows": self.rows})
+        self._reset()
+
+    def close(self):
+        self.flush()
+        meta = {
+            "version": 1,
+            "columns": {name: descr for name, (_, descr) in COLUMNS.items()},
+            "alphabet": "".join(p.drum_lang_code for p in drum_lang_primitives),
+            "chunks": self.chunks,
+            "rows": sum(chunk["rows"] for chunk in self.chunks),
+        }
+        (self.directory / "meta.json").write_text(json.dumps(meta, indent=2))
+
+
+def export_tasks(
+    tasks: Iterable[InfillTask],
+    directory: Path,
+    frontiers: Optional[Frontiers] = None,
+    chunk_size: int = 65536,
+) -> int:
+    """Export tasks, and optionally their frontiers, returning the row count"""
+    writer = ColumnarWriter(directory, chunk_size)
+    for task in tasks:
+        writer.add(task, frontiers)
+    writer.close()
+    return sum(chunk["rows"] for chunk in writer.chunks)
+
+
+def load_meta(directory: Path) -> dict:
+    return json.loads((Path(directory) / "meta.json").read_text())
+
+
+def load_chunk(directory: Path, name: str) -> Dict[str, memoryview]:
+    """Zero-copy views of every column of one chunk"""
+    chunk_dir = Path(directory) / name
+    return {
+        column: read_npy(chunk_dir / f"{column}.npy", typecode)
+        for column, (typecode, _) in COLUMNS.items()
+    }
+
+
+def decode(codes: Iterable[int]) -> str:
+    """Drum lang string of a code column slice"""
+    alphabet = [p.drum_lang_code for p in drum_lang_primitives]
+    return "".join(alphabet[code] for code in codes)
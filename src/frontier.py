@@ -0,0 +1,4 @@
+from typing import Dict, List, Tuple
+
+# Solutions found per task: task signature -> [(priority, track string)]
+Frontiers = Dict[str, List[Tuple[float, str]]]
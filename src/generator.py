@@ -1,6 +1,11 @@
-from typing import List, Tuple
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+from cache import EnumerationCache, enumeration_key
 from grammar import Grammar
 from dataset import InfillTask
+from drum_lang import ParseState, resume_parse
+from metrics import NULL_METRICS, Metrics
+from primitives import Beat, NoteLength, Primitive
 import time
 
 
@@ -13,66 +18,240 @@ def score_track(generated_track, task: InfillTask) -> Tuple[bool, float]:
         return False, float("-inf")
 
 
+class HoleVerifier:
+    """Verifies candidate fills for one task without reparsing the track.
+
+    The prefix before the hole is parsed once into a resumable state. The
+    suffix only depends on the fill up to its first note length, after which
+    the parse is back in sync, so a candidate is checked by parsing the fill
+    plus that short stretch and comparing the resulting beats with the
+    answer's. Cost per candidate is independent of the track length.
+    """
+
+    def __init__(self, task: InfillTask):
+        track = task.original_track
+        start = task.hole_start
+        end = start + len(task.hole_indices)
+        suffix = track[end:]
+        resync = next(
+            (i + 1 for i, p in enumerate(suffix) if isinstance(p, NoteLength)),
+            len(suffix),
+        )
+        self.suffix_head = suffix[:resync]
+        try:
+            self.prefix_state, _ = resume_parse(ParseState(), track[:start])
+        except ValueError:
+            # Invalid prefix, no fill can match so the task is unsolvable
+            self.prefix_state = None
+            self.answer = None
+        else:
+            self.answer = self.window(track[start:end])
+        self.prefix_code = "".join(p.drum_lang_code for p in track[:start])
+        self.suffix_code = "".join(p.drum_lang_code for p in suffix)
+
+    def window(
+        self, fill: Sequence[Primitive]
+    ) -> Optional[Tuple[ParseState, List[Beat]]]:
+        """Beats from the start of the hole's beat to the resync point"""
+        try:
+            state, beats = resume_parse(self.prefix_state, [*fill, *self.suffix_head])
+        except ValueError:
+            return None
+        return state, beats
+
+    def score(self, fill: Sequence[Primitive]) -> Tuple[bool, float]:
+        if self.answer is not None and self.window(fill) == self.answer:
+            return True, 0.0
+        return False, float("-inf")
+
+    def track_string(self, fill: Sequence[Primitive]) -> str:
+        fill_code = "".join(p.drum_lang_code for p in fill)
+        return self.prefix_code + fill_code + self.suffix_code
+
+
+@dataclass(frozen=True)
+class Solution:
+    """A fill that solves a task, emitted as soon as it is found"""
+
+    task_signature: str
+    priority: float
+    track: str
+    elapsed: float  # seconds since enumeration started
+
+
 # Each track has a fixed MDL, so it can only appear in one slice. This ensures that
 # a track is not generated multiple times.
 # equivalent to @enumerateForTasks in DreamCoder
 # All tasks must have the same hole type and should expect the same grammar
-def generate_tracks(
+def enumerate_solutions(
     grammar: Grammar,
     tasks: List[InfillTask],
     lower_bound: float = 0,
     upper_bound: float = 100,
     budget_increment: float = 1.0,
     timeout_seconds: float = 2,
-):
+    check_every: int = 256,
+    debug: bool = False,
+    metrics: Metrics = NULL_METRICS,
+    cache: Optional[EnumerationCache] = None,
+) -> Iterator[Solution]:
+    """Anytime search: yields every solution as soon as it is found.
 
+    The deadline is checked with time.monotonic once every `check_every`
+    candidate evaluations rather than per candidate. A task stops being
+    scored once it is solved, and each group of tasks gets a share of the
+    remaining time proportional to its unsolved tasks, so time freed by
+    solved tasks and finished groups moves to the tasks still open.
+    """
     request = tasks[0].hole_type
     assert all(
         t.hole_type == request for t in tasks
     ), "generate_tracks: Expected tasks to all have the same hole type"
 
-    start_time = time.time()
-    previous_budget = lower_bound
-    budget = lower_bound + budget_increment
-    generated_tracks_per_task = {t.task_signature: [] for t in tasks}
+    start = time.monotonic()
+    deadline = start + timeout_seconds
+    # number of candidates tried before each task's first solution
+    candidates_to_solve = {}
     total_programs = 0
     valid_programs = 0
 
-    enumerations = grammar.fill_holes(request, debug=True)
-    if len(enumerations) == 0:
-        print("No valid tracks for any task")
-        return generated_tracks_per_task
+    contexts = [t.hole_context for t in tasks]
+    verifiers = [HoleVerifier(t) for t in tasks]
 
-    for prior, production in enumerations:
-        total_programs += 1
+    # A contextual grammar ranks fills differently depending on the primitive
+    # before the hole, so tasks are enumerated in groups sharing it
+    groups = {}
+    for i, task in enumerate(tasks):
+        previous = task.previous_primitive if grammar.contextual else None
+        groups.setdefault(previous, []).append(i)
 
-        if time.time() - start_time > timeout_seconds:
-            print(f"Timeout reached. Stopping generation.")
-            print(f"Total tracks generated: {total_programs}")
-            print(f"Total valid tracks: {valid_programs}")
-            return generated_tracks_per_task
+    unsolved = len(tasks)
+    try:
+        for previous, indices in groups.items():
+            now = time.monotonic()
+            if now > deadline:
+                print(f"Timeout reached. Stopping generation.")
+                metrics.inc("timeouts")
+                break
+            group_deadline = now + (deadline - now) * len(indices) / unsolved
 
-        for i, task in enumerate(tasks):
-            generated_track = task.to_drum_lang_string(with_hole=True).replace(
-                "?", production.drum_lang_code
+            group_contexts = [contexts[i] for i in indices]
+            fill_holes = lambda: grammar.fill_holes(
+                request,
+                upper_bound=upper_bound,
+                debug=debug,
+                contexts=group_contexts,
+                previous=previous,
             )
-
-            success, likelihood = score_track(generated_track, task)
-            if not success:
+            with metrics.phase("fill_holes"):
+                if cache is None:
+                    enumerations = fill_holes()
+                else:
+                    key = enumeration_key(
+                        grammar,
+                        request,
+                        group_contexts,
+                        previous,
+                        upper_bound=upper_bound,
+                    )
+                    enumerations = cache.get_or_compute(key, fill_holes)
+            if len(enumerations) == 0:
+                print("No valid tracks for any task")
+                unsolved -= len(indices)
                 continue
 
-            valid_programs += 1
-            priority = -(likelihood + prior)
-            generated_tracks_per_task[task.task_signature].append(
-                (priority, generated_track)
-            )
+            active = list(indices)
+            budget = lower_bound + budget_increment
+            work = 0
+            for rank, (prior, production) in enumerate(enumerations, start=1):
+                total_programs += 1
+                work += len(active)
+                if work >= check_every:
+                    work = 0
+                    if time.monotonic() > group_deadline:
+                        metrics.inc("group_timeouts")
+                        break
+
+                for i in list(active):
+                    task, context, verifier = tasks[i], contexts[i], verifiers[i]
+                    # The same production fills every hole position
+                    fill = [production] * len(task.hole_indices)
+                    if not context.accepts(fill):
+                        metrics.inc("programs_pruned")
+                        continue
+
+                    success, likelihood = verifier.score(fill)
+                    if not success:
+                        continue
+
+                    valid_programs += 1
+                    candidates_to_solve[task.task_signature] = rank
+                    # Exact matching admits one solution per task, stop
+                    # spending candidates on it
+                    active.remove(i)
+                    elapsed = time.monotonic() - start
+                    metrics.observe("time_to_first_solution_seconds", elapsed)
+                    yield Solution(
+                        task.task_signature,
+                        -(likelihood + prior),
+                        verifier.track_string(fill),
+                        elapsed,
+                    )
 
-        previous_budget = budget
-        budget += budget_increment
+                budget += budget_increment
+                if not active or budget > upper_bound:
+                    break
 
-        if budget > upper_bound:
-            break
+            unsolved -= len(indices)
+    finally:
+        if metrics.enabled:
+            elapsed = time.monotonic() - start
+            metrics.observe("phase_enumerate_seconds", elapsed)
+            metrics.inc("programs_total", total_programs)
+            metrics.inc("programs_valid", valid_programs)
+            metrics.inc("tasks_total", len(tasks))
+            metrics.inc("tasks_solved", len(candidates_to_solve))
+            if elapsed > 0:
+                metrics.set("programs_per_second", total_programs / elapsed)
+            for task in tasks:
+                metrics.observe(
+                    "candidates_per_task",
+                    candidates_to_solve.get(task.task_signature, total_programs),
+                )
+
+
+def generate_tracks(
+    grammar: Grammar,
+    tasks: List[InfillTask],
+    lower_bound: float = 0,
+    upper_bound: float = 100,
+    budget_increment: float = 1.0,
+    timeout_seconds: float = 2,
+    debug: bool = False,
+    metrics: Metrics = NULL_METRICS,
+    cache: Optional[EnumerationCache] = None,
+    on_solution: Optional[Callable[[Solution], None]] = None,
+):
+    """Run enumerate_solutions to completion, collecting (priority, track)
+    pairs per task signature. `on_solution` sees each solution as it is found."""
+    generated_tracks_per_task = {t.task_signature: [] for t in tasks}
+    for solution in enumerate_solutions(
+        grammar,
+        tasks,
+        lower_bound=lower_bound,
+        upper_bound=upper_bound,
+        budget_increment=budget_increment,
+        timeout_seconds=timeout_seconds,
+        debug=debug,
+        metrics=metrics,
+        cache=cache,
+    ):
+        generated_tracks_per_task[solution.task_signature].append(
+            (solution.priority, solution.track)
+        )
+        if on_solution is not None:
+            on_solution(solution)
 
-    print(f"Generation completed. Total programs generated: {total_programs}")
-    print(f"Total valid programs: {valid_programs}")
+    solved = sum(1 for tracks in generated_tracks_per_task.values() if tracks)
+    print(f"Generation completed. Solved {solved} of {len(tasks)} tasks")
     return generated_tracks_per_task
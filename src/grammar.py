@@ -1,7 +1,11 @@
+import hashlib
+import math
+from array import array
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
-from primitives import DrumSound, NoteLength, Primitive, PrimitiveType
+from automaton import HoleContext
+from primitives import DrumSound, FlatTrack, NoteLength, Primitive, PrimitiveType
 from utils import lse
 
 LogProb = float
@@ -57,6 +61,9 @@ class LikelihoodSummary:
 class Grammar:
     productions: List[Production]
 
+    # Whether candidates depend on the primitive before the hole
+    contextual = False
+
     def __init__(self, productions: List[Production]):
         self.productions = productions
         self.primitive_to_logprob = {p: logprob for logprob, p in productions}
@@ -64,6 +71,11 @@ class Grammar:
     def __hash__(self):
         return hash(tuple(self.productions))
 
+    def content_hash(self) -> str:
+        """Hash of the productions that is stable across processes"""
+        content = ";".join(f"{lp!r}:{p.drum_lang_code}" for lp, p in self.productions)
+        return hashlib.sha256(content.encode()).hexdigest()
+
     @staticmethod
     def uniform(primitives: List[Primitive]) -> "Grammar":
         return Grammar([(0.0, p) for p in primitives])
@@ -76,6 +88,11 @@ class Grammar:
         z = lse([logProb for logProb, p in candidates])
         return [(logProb - z, p) for logProb, p in candidates]
 
+    def _candidates(
+        self, request: PrimitiveType, previous: Optional[Primitive]
+    ) -> List[Production]:
+        return self.get_candidates(request)
+
     def inside_outside(self) -> Production:
         pass
 
@@ -90,10 +107,24 @@ class Grammar:
         lower_bound: float = 0,
         upper_bound: float = 100,
         debug: bool = False,
+        contexts: Optional[Sequence[HoleContext]] = None,
+        previous: Optional[Primitive] = None,
     ):
+        """Candidates for a hole as (mdl, primitive) pairs.
+
+        If `contexts` is given, candidates that would make the track around
+        every one of the holes structurally invalid are pruned. `previous` is
+        the primitive before the hole, only used by contextual grammars.
+        """
         if upper_bound < 0 or max_depth == 1:
             return
-        candidates = self.get_candidates(request)
+        candidates = self._candidates(request, previous)
+        if contexts is not None:
+            candidates = [
+                (logProb, p)
+                for logProb, p in candidates
+                if any(context.allows(p) for context in contexts)
+            ]
         if debug:
             print(f"Candidates for filling hole of type {request}:")
             print("-" * 25)
@@ -105,4 +136,129 @@ class Grammar:
             if mdl > upper_bound:
                 continue
             valid_candidates.append((mdl, p))
-        return valid_candidates
+        return sorted(valid_candidates, key=lambda c: c[0])
+
+
+class ContextualGrammar(Grammar):
+    """Bigram grammar: production log probabilities conditioned on the
+    previous primitive, like DreamCoder's ContextualGrammar.
+
+    Log probabilities live in a dense transition table with one row per
+    previous primitive (plus a start row) and one column per primitive, both
+    indexed by primitives.primitive_ids. Normalized candidate lists are
+    precomputed per (row, request), so lookups during enumeration are O(1).
+    """
+
+    contextual = True
+
+    def __init__(self, primitives: List[Primitive], table: Sequence[float]):
+        self.primitives = list(primitives)
+        self.size = len(self.primitives)
+        self.start_row = self.size
+        if len(table) != (self.size + 1) * self.size:
+            raise ValueError("Transition table does not match the primitives")
+        self.table = array("d", table)
+        self.ids = {p.drum_lang_code: i for i, p in enumerate(self.primitives)}
+
+        # Marginal productions keep the unigram interface working
+        super().__init__(
+            [(self.logprob(p, None), p) for p in self.primitives],
+        )
+
+        self._normalized: Dict[Tuple[int, PrimitiveType], List[Production]] = {}
+        # Normalized log probability of each (row, column) transition
+        self._transition: Dict[Tuple[int, int], LogProb] = {}
+        for row in range(self.size + 1):
+            for request in PrimitiveType:
+                columns = [
+                    i for i, p in enumerate(self.primitives) if p.type == request
+                ]
+                if not columns:
+                    continue
+                z = lse([self.table[row * self.size + i] for i in columns])
+                self._normalized[row, request] = [
+                    (self.table[row * self.size + i] - z, self.primitives[i])
+                    for i in columns
+                ]
+                for i in columns:
+                    self._transition[row, i] = self.table[row * self.size + i] - z
+
+    def __hash__(self):
+        return hash(self.table.tobytes())
+
+    def content_hash(self) -> str:
+        codes = "".join(p.drum_lang_code for p in self.primitives)
+        return hashlib.sha256(codes.encode() + self.table.tobytes()).hexdigest()
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ContextualGrammar)
+            and self.primitives == other.primitives
+            and self.table == other.table
+        )
+
+    @staticmethod
+    def uniform(primitives: List[Primitive]) -> "ContextualGrammar":
+        size = len(primitives)
+        return ContextualGrammar(primitives, [0.0] * ((size + 1) * size))
+
+    @staticmethod
+    def from_tracks(
+        primitives: List[Primitive],
+        tracks: List[FlatTrack],
+        smoothing: float = 1.0,
+        weights: Optional[Sequence[float]] = None,
+    ) -> "ContextualGrammar":
+        """Fit transition log probabilities to bigram counts in `tracks`.
+
+        `weights` scales each track's counts, e.g. InfillTask.weight.
+        """
+        size = len(primitives)
+        ids = {p.drum_lang_code: i for i, p in enumerate(primitives)}
+        counts = [smoothing] * ((size + 1) * size)
+        for n, track in enumerate(tracks):
+            weight = weights[n] if weights is not None else 1.0
+            row = size
+            for primitive in track:
+                column = ids[primitive.drum_lang_code]
+                counts[row * size + column] += weight
+                row = column
+        return ContextualGrammar(primitives, [math.log(c) for c in counts])
+
+    def row(self, previous: Optional[Primitive]) -> int:
+        if previous is None:
+            return self.start_row
+        return self.ids[previous.drum_lang_code]
+
+    def logprob(self, primitive: Primitive, previous: Optional[Primitive]) -> LogProb:
+        """Unnormalized log probability of `primitive` after `previous`"""
+        column = self.ids[primitive.drum_lang_code]
+        return self.table[self.row(previous) * self.size + column]
+
+    def get_candidates(
+        self, request: PrimitiveType, previous: Optional[Primitive] = None
+    ) -> List[Production]:
+        return self._normalized.get((self.row(previous), request), [])
+
+    def _candidates(
+        self, request: PrimitiveType, previous: Optional[Primitive]
+    ) -> List[Production]:
+        return self.get_candidates(request, previous)
+
+    def transition_counts(self, track: FlatTrack) -> Dict[Tuple[int, int], int]:
+        """How often each (previous row, primitive id) transition is used"""
+        summary: Dict[Tuple[int, int], int] = {}
+        row = self.start_row
+        for primitive in track:
+            column = self.ids[primitive.drum_lang_code]
+            summary[row, column] = summary.get((row, column), 0) + 1
+            row = column
+        return summary
+
+    def log_likelihood(self, track: FlatTrack) -> float:
+        """Log probability of a track, each primitive normalized against the
+        candidates of its type after the previous primitive"""
+        return sum(
+            count * self._transition[transition]
+            for transition, count in self.transition_counts(track).items()
+        )
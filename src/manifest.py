@@ -0,0 +1,234 @@
+"""Incremental task generation over a growing corpus.
+
+A manifest in `directory/manifest.json` records the size, mtime and sha256
+of every source file and the ids of the tasks generated from it, and the
+tasks themselves are stored per content digest in `directory/tasks/`.
+`refresh` only parses files that are new or whose content changed, and
+drops the tasks of deleted files. Every other task keeps its id, so
+frontiers and checkpoints keyed by task stay valid.
+
+A file's tasks are generated with the random generator seeded by the file's
+digest, so the same content always gives the same tasks, whatever else is
+in the corpus.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from dataset import (
+    InfillTask,
+    init_drum_dataset,
+    iter_tasks,
+    load_track,
+    task_from_dict,
+    task_to_dict,
+)
+from metrics import NULL_METRICS, Metrics
+
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _seeded(seed: str):
+    """Seed the global generator, used by task generation, for one block"""
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+
+
+@dataclass
+class RefreshResult:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    tasks_added: int = 0
+    tasks_removed: int = 0
+
+
+class DatasetManifest:
+    """Tasks of a corpus, kept up to date one source file at a time"""
+
+    def __init__(
+        self,
+        directory: Path,
+        min_beats: int = 12,
+        max_beats: int = 24,
+        hole_length: int = 1,
+        max_tasks_per_file: Optional[int] = None,
+        align_measures: bool = False,
+        metrics: Metrics = NULL_METRICS,
+    ):
+        self.directory = Path(directory)
+        self.tasks_dir = self.directory / "tasks"
+        self.path = self.directory / "manifest.json"
+        self.params = {
+            "min_beats": min_beats,
+            "max_beats": max_beats,
+            "hole_length": hole_length,
+            "max_tasks_per_file": max_tasks_per_file,
+            "align_measures": align_measures,
+        }
+        self.metrics = metrics
+        self.files: Dict[str, dict] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        data = json.loads(self.path.read_text())
+        if data.get("version") == MANIFEST_VERSION and data["params"] == self.params:
+            self.files = data["files"]
+        else:
+            # Tasks generated with other settings are all stale
+            shutil.rmtree(self.tasks_dir, ignore_errors=True)
+
+    def save(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "params": self.params,
+            "files": self.files,
+        }
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
+
+    def _tasks_path(self, digest: str) -> Path:
+        return self.tasks_dir / f"{digest}.json"
+
+    def _generate(self, path: Path, digest: str) -> List[str]:
+        """Generate and store the tasks of one file, returning their ids"""
+        tasks_path = self._tasks_path(digest)
+        if tasks_path.exists():
+            # Same content already seen under another name
+            tasks = [task_from_dict(t) for t in json.loads(tasks_path.read_text())]
+            return [task.task_id for task in tasks]
+        try:
+            track = load_track(path)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            track = None
+        tasks = []
+        if track:
+            with _seeded(digest):
+                stream = iter_tasks(
+                    [track],
+                    min_beats=self.params["min_beats"],
+                    max_beats=self.params["max_beats"],
+                    hole_length=self.params["hole_length"],
+                    metrics=self.metrics,
+                    align_measures=self.params["align_measures"],
+                )
+                tasks = list(islice(stream, self.params["max_tasks_per_file"]))
+        self.tasks_dir.mkdir(parents=True, exist_ok=True)
+        tasks_path.write_text(json.dumps([task_to_dict(t) for t in tasks]))
+        return [task.task_id for task in tasks]
+
+    def refresh(self, tab_files: Iterable[Path]) -> RefreshResult:
+        """Bring the manifest in line with `tab_files` and save it"""
+        result = RefreshResult()
+        seen = set()
+        for path in tab_files:
+            key = str(path)
+            seen.add(key)
+            stat = os.stat(path)
+            entry = self.files.get(key)
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                result.unchanged.append(key)
+                continue
+
+            digest = file_digest(path)
+            if entry is not None and entry["digest"] == digest:
+                # Touched but not modified
+                entry["mtime_ns"] = stat.st_mtime_ns
+                result.unchanged.append(key)
+                continue
+
+            task_ids = self._generate(path, digest)
+            old_ids = set(entry["tasks"]) if entry is not None else set()
+            (result.added if entry is None else result.changed).append(key)
+            result.tasks_added += len(set(task_ids) - old_ids)
+            result.tasks_removed += len(old_ids - set(task_ids))
+            self.files[key] = {
+                "digest": digest,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "tasks": task_ids,
+            }
+
+        for key in sorted(set(self.files) - seen):
+            result.removed.append(key)
+            result.tasks_removed += len(self.files.pop(key)["tasks"])
+        self._collect_garbage()
+        self.save()
+
+        parsed = len(result.added) + len(result.changed)
+        self.metrics.inc("refresh_files_parsed", parsed)
+        self.metrics.inc("refresh_files_skipped", len(result.unchanged))
+        print(
+            f"Refreshed dataset: {len(result.added)} added, "
+            f"{len(result.changed)} changed, {len(result.removed)} removed, "
+            f"{len(result.unchanged)} unchanged"
+        )
+        return result
+
+    def _collect_garbage(self):
+        """Delete stored tasks that no file refers to anymore"""
+        if not self.tasks_dir.exists():
+            return
+        live = {entry["digest"] for entry in self.files.values()}
+        for tasks_path in self.tasks_dir.glob("*.json"):
+            if tasks_path.stem not in live:
+                tasks_path.unlink()
+
+    def task_ids(self) -> List[str]:
+        """Ids of tasks(), in the same order"""
+        ids = (i for key in sorted(self.files) for i in self.files[key]["tasks"])
+        return list(dict.fromkeys(ids))
+
+    def tasks(self) -> List[InfillTask]:
+        """All tasks, ordered by source file, without duplicates across files"""
+        tasks: Dict[str, InfillTask] = {}
+        for key in sorted(self.files):
+            digest = self.files[key]["digest"]
+            for data in json.loads(self._tasks_path(digest).read_text()):
+                task = task_from_dict(data)
+                tasks.setdefault(task.task_id, task)
+        return list(tasks.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the task dataset")
+    parser.add_argument("--gp-dir", default="./data/gp")
+    parser.add_argument("--out", type=Path, default=Path("./data/tasks"))
+    args = parser.parse_args()
+
+    manifest = DatasetManifest(args.out)
+    result = manifest.refresh(init_drum_dataset(args.gp_dir))
+    print(f"{result.tasks_added} tasks added, {result.tasks_removed} removed")
+    print(f"{len(manifest.task_ids())} tasks in total")
@@ -0,0 +1,143 @@
+"""Memory budget tracking and disk spilling for large corpora.
+
+MemoryBudget samples tracemalloc's traced size every `check_every` calls to
+`over()`, so the hot loops that ask whether to spill pay one counter
+increment per item. SpillList is an append-only list that pickles its
+buffer to a temporary directory whenever the budget is exceeded and reads
+the batches back lazily when iterated.
+"""
+
+import pickle
+import shutil
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Generic, Iterator, List, Optional, TypeVar
+
+from metrics import NULL_METRICS, Metrics
+
+T = TypeVar("T")
+
+
+class MemoryBudget:
+    """A cap on traced Python allocations, with peak memory per phase"""
+
+    def __init__(
+        self,
+        limit_bytes: int,
+        check_every: int = 256,
+        metrics: Metrics = NULL_METRICS,
+    ):
+        self.limit_bytes = limit_bytes
+        self.check_every = check_every
+        self.metrics = metrics
+        self.peaks: Dict[str, int] = {}
+        self._calls = check_every - 1  # the first call samples
+        self._over = False
+        self._started = False
+
+    def start(self) -> "MemoryBudget":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        return self
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def __enter__(self) -> "MemoryBudget":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def current(self) -> int:
+        return tracemalloc.get_traced_memory()[0]
+
+    def over(self) -> bool:
+        """Whether the budget is exceeded, sampled every `check_every` calls"""
+        self._calls += 1
+        if self._calls >= self.check_every:
+            self._calls = 0
+            self._over = self.current() > self.limit_bytes
+        return self._over
+
+    def reset(self):
+        """Resample on the next call, e.g. after a spill released memory"""
+        self._calls = self.check_every - 1
+        self._over = False
+
+    @contextmanager
+    def phase(self, name: str):
+        """Record the peak traced memory while the block runs"""
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+            self.metrics.set(f"peak_memory_bytes_{name}", self.peaks[name])
+
+    def report(self) -> Dict[str, int]:
+        return dict(self.peaks)
+
+
+class SpillList(Generic[T]):
+    """Append-only list that moves its contents to disk when over budget"""
+
+    def __init__(
+        self,
+        budget: MemoryBudget,
+        directory: Optional[Path] = None,
+        batch_size: int = 1024,
+    ):
+        self.budget = budget
+        self.batch_size = batch_size
+        if directory is not None:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+        # A private subdirectory, so several lists can share `directory`
+        self.directory = Path(tempfile.mkdtemp(prefix="spill-", dir=directory))
+        self.buffer: List[T] = []
+        self.files: List[Path] = []
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, item: T):
+        self.buffer.append(item)
+        self._length += 1
+        if len(self.buffer) >= self.batch_size and self.budget.over():
+            self.spill()
+
+    def spill(self):
+        """Write the buffered items to disk and drop them from memory"""
+        if not self.buffer:
+            return
+        path = self.directory / f"batch_{len(self.files):06d}.pickle"
+        with open(path, "wb") as f:
+            pickle.dump(self.buffer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.files.append(path)
+        self.buffer = []
+        self.budget.reset()
+        self.budget.metrics.inc("spilled_batches")
+
+    def __iter__(self) -> Iterator[T]:
+        for path in self.files:
+            with open(path, "rb") as f:
+                yield from pickle.load(f)
+        yield from self.buffer
+
+    def close(self):
+        self.buffer = []
+        self.files = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self) -> "SpillList[T]":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,180 @@
+"""Streaming reader for drum tracks in Standard MIDI Files.
+
+Files are read event by event: chunk headers are scanned once to find the
+track chunks, then every track chunk is streamed from its own file handle
+and the tracks are merged by tick. Only note-ons on the percussion channel
+(MIDI channel 10) are kept, quantized to the 1/64 NoteLength grid.
+"""
+
+import heapq
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+from primitives import (
+    Beat,
+    DrumSound,
+    Hits,
+    NoteLength,
+    PlayableTrack,
+    Rest,
+    TICKS_PER_WHOLE,
+    TickGrid,
+    note_lengths,
+)
+
+PERCUSSION_CHANNEL = 9  # zero based, channel 10 in MIDI terms
+DEFAULT_TEMPO = 500000  # microseconds per quarter note, i.e. 120 bpm
+GRID = TICKS_PER_WHOLE  # quantize onsets to 1/64 notes, the tick grid
+
+# Note lengths measured in grid steps, longest first for greedy splitting
+grid_lengths: List[Tuple[int, NoteLength]] = sorted(
+    ((length.ticks, length) for length in note_lengths.values()),
+    key=lambda pair: -pair[0],
+)
+
+# (tick, kind, value) where kind is "note", "tempo" or "time_signature"
+Event = Tuple[int, str, object]
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Unexpected end of MIDI file")
+    return data
+
+
+def _read_varlen(f: BinaryIO) -> int:
+    value = 0
+    while True:
+        byte = _read_exact(f, 1)[0]
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value
+
+
+def read_header(file_path: Path) -> Tuple[int, List[Tuple[int, int]]]:
+    """Ticks per quarter note and (offset, length) of every track chunk"""
+    tracks = []
+    with open(file_path, "rb") as f:
+        chunk, length = struct.unpack(">4sI", _read_exact(f, 8))
+        if chunk != b"MThd":
+            raise ValueError(f"Not a MIDI file: {file_path}")
+        _, _, division = struct.unpack(">HHH", _read_exact(f, 6))
+        f.seek(length - 6, 1)
+        if division & 0x8000:
+            raise ValueError("SMPTE time division is not supported")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            chunk, length = struct.unpack(">4sI", header)
+            if chunk == b"MTrk":
+                tracks.append((f.tell(), length))
+            f.seek(length, 1)
+    return division, tracks
+
+
+def iter_track_events(file_path: Path, offset: int, length: int) -> Iterator[Event]:
+    """Stream the relevant events of one track chunk in tick order"""
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        end = offset + length
+        tick = 0
+        status = None
+        while f.tell() < end:
+            tick += _read_varlen(f)
+            byte = _read_exact(f, 1)[0]
+            if byte == 0xFF:
+                meta = _read_exact(f, 1)[0]
+                data = _read_exact(f, _read_varlen(f))
+                if meta == 0x51:
+                    yield tick, "tempo", int.from_bytes(data, "big")
+                elif meta == 0x58:
+                    yield tick, "time_signature", (data[0], 2 ** data[1])
+                elif meta == 0x2F:
+                    return
+                continue
+            if byte in (0xF0, 0xF7):
+                f.seek(_read_varlen(f), 1)
+                continue
+            if byte & 0x80:
+                status = byte
+                first = _read_exact(f, 1)[0]
+            elif status is None:
+                raise ValueError("Running status without a previous status byte")
+            else:
+                # Running status, the byte read is already the first data byte
+                first = byte
+            kind = status & 0xF0
+            if kind in (0xC0, 0xD0):
+                continue
+            second = _read_exact(f, 1)[0]
+            if kind == 0x90 and second > 0 and status & 0x0F == PERCUSSION_CHANNEL:
+                yield tick, "note", first
+
+
+def iter_events(file_path: Path) -> Iterator[Event]:
+    """Events of all track chunks merged by tick"""
+    _, tracks = read_header(file_path)
+    streams = [iter_track_events(file_path, offset, n) for offset, n in tracks]
+    return heapq.merge(*streams, key=lambda event: event[0])
+
+
+def split_length(steps: int) -> List[NoteLength]:
+    """Cover `steps` grid steps with as few note lengths as possible"""
+    lengths = []
+    for size, length in grid_lengths:
+        while steps >= size:
+            lengths.append(length)
+            steps -= size
+    return lengths
+
+
+def parse_playable_track_from_midi(file_path: Path) -> PlayableTrack:
+    """Read the percussion channel of a MIDI file into a PlayableTrack.
+
+    Onsets are snapped to the 1/64 grid and simultaneous notes become one
+    beat. A beat lasts until the next onset; gaps that are not a single
+    note length are split, with the remainder filled by rests. The last
+    beat lasts until the end of its bar.
+    """
+    ticks_per_quarter, _ = read_header(file_path)
+    ticks_per_step = ticks_per_quarter * 4 / GRID
+    tempo = None
+    bar_steps = GRID  # 4/4 unless the file says otherwise
+
+    onsets: Dict[int, Hits] = {}
+    for tick, kind, value in iter_events(file_path):
+        if kind == "note":
+            step = round(tick / ticks_per_step)
+            hits = onsets.setdefault(step, [])
+            sound = DrumSound.from_midi_value(value)
+            if sound not in hits:
+                hits.append(sound)
+        elif kind == "tempo" and tempo is None:
+            tempo = value
+        elif kind == "time_signature" and not onsets:
+            numerator, denominator = value
+            bar_steps = numerator * GRID // denominator
+
+    bpm = round(60_000_000 / (tempo or DEFAULT_TEMPO))
+    beats: List[Beat] = []
+    steps = sorted(onsets)
+    if not steps:
+        return PlayableTrack(beats=beats, bpm=bpm)
+
+    def add(hits: Hits, gap: int):
+        lengths = split_length(gap)
+        beats.append(Beat(hits=hits, length=lengths[0]))
+        beats.extend(Beat(hits=[Rest()], length=length) for length in lengths[1:])
+
+    if steps[0] > 0:
+        add([Rest()], steps[0])
+    for step, next_step in zip(steps, steps[1:]):
+        add(onsets[step], next_step - step)
+    last = steps[-1]
+    add(onsets[last], (last // bar_steps + 1) * bar_steps - last)
+    track = PlayableTrack(beats=beats, bpm=bpm)
+    track.measure_starts = list(TickGrid.from_track(track, bar_steps).measure_starts)
+    return track
@@ -1,7 +1,12 @@
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
 from enum import Enum, auto
 from pathlib import Path
-from typing import List, Union
+from typing import List, Optional, Sequence, Union
+
+# Resolution of the tick grid, every NoteLength is a whole number of ticks
+TICKS_PER_WHOLE = 64
 
 
 class PrimitiveType(Enum):
@@ -42,6 +47,22 @@ class NoteLength(Primitive):
             val += " dotted"
         return val
 
+    @property
+    def time(self) -> float:
+        """Duration as a fraction of a whole note"""
+        duration = 1 / self.value
+        if self.is_dotted:
+            duration += duration / 2
+        return duration
+
+    @property
+    def ticks(self) -> int:
+        """Duration on the tick grid"""
+        ticks = TICKS_PER_WHOLE // self.value
+        if self.is_dotted:
+            ticks += ticks // 2
+        return ticks
+
     @classmethod
     def from_drum_lang_code(cls, code: str) -> "NoteLength":
         return next(
@@ -227,6 +248,83 @@ if len(drum_lang_codes) != len(set(drum_lang_codes)):
 
 Hits = List[Union[DrumSound, Rest]]
 
+# Most simultaneous hits a single beat may contain
+MAX_HITS = 4
+
+# Registry order defines the canonical order of simultaneous hits
+sound_registry: List[Union[DrumSound, Rest]] = list(drum_sounds.values())
+length_registry: List[NoteLength] = list(note_lengths.values())
+sound_bits = {sound.drum_lang_code: 1 << i for i, sound in enumerate(sound_registry)}
+length_ids = {length.drum_lang_code: i for i, length in enumerate(length_registry)}
+if len(sound_registry) > 32:
+    raise ValueError("Chord masks hold at most 32 drum sounds")
+
+
+@dataclass(frozen=True)
+class Chord:
+    """Hits of a beat as a 32-bit mask over the drum sound registry, plus
+    the id of the beat's length. Equal chords always serialize the same way,
+    whatever order their hits were written in."""
+
+    mask: int
+    length_id: int
+
+    @classmethod
+    def from_hits(cls, hits: Hits, length: NoteLength) -> "Chord":
+        mask = 0
+        for hit in hits:
+            mask |= sound_bits[hit.drum_lang_code]
+        return cls(mask, length_ids[length.drum_lang_code])
+
+    @property
+    def hits(self) -> Hits:
+        """Hits in canonical order"""
+        mask = self.mask
+        hits = []
+        while mask:
+            low = mask & -mask
+            hits.append(sound_registry[low.bit_length() - 1])
+            mask ^= low
+        return hits
+
+    @property
+    def length(self) -> NoteLength:
+        return length_registry[self.length_id]
+
+    @property
+    def key(self) -> int:
+        """Single integer identifying the chord, for hashing and sorting"""
+        return self.length_id << 32 | self.mask
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __contains__(self, sound: Union[DrumSound, Rest]) -> bool:
+        return bool(self.mask & sound_bits[sound.drum_lang_code])
+
+    def union(self, other: "Chord") -> "Chord":
+        """Hits of either chord, with this chord's length"""
+        return Chord(self.mask | other.mask, self.length_id)
+
+    def intersection(self, other: "Chord") -> "Chord":
+        """Hits of both chords, with this chord's length"""
+        return Chord(self.mask & other.mask, self.length_id)
+
+    def similarity(self, other: "Chord") -> float:
+        """Jaccard similarity of the hits, ignoring length"""
+        union = self.union(other)
+        if not union.mask:
+            return 1.0
+        return len(self.intersection(other)) / len(union)
+
+    def to_drum_lang(self) -> str:
+        return "".join(hit.drum_lang_code for hit in self.hits) + (
+            self.length.drum_lang_code
+        )
+
+    def to_beat(self) -> "Beat":
+        return Beat(hits=self.hits, length=self.length)
+
 
 @dataclass
 class Beat:
@@ -236,6 +334,11 @@ class Beat:
 
     hits: Hits
     length: Union[NoteLength]
+    # The hits as a registry bitmask, built once with the beat
+    chord: Chord = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.chord = Chord.from_hits(self.hits, self.length)
 
     @property
     def cost(self) -> float:
@@ -250,27 +353,115 @@ FlatTrack = List[Union[DrumSound, NoteLength]]
 InfillTrack = List[Union[DrumSound, NoteLength, Hole]]
 
 
+def measure_starts_from_onsets(
+    onsets: Sequence[int], bar_ticks: int = TICKS_PER_WHOLE
+) -> array:
+    """Index of the first beat at or after every bar line"""
+    starts = array("i")
+    bar = -1
+    for i, tick in enumerate(onsets[:-1]):
+        if tick // bar_ticks != bar:
+            bar = tick // bar_ticks
+            starts.append(i)
+    return starts
+
+
+class TickGrid:
+    """Beat onsets of a track on a fixed-resolution tick grid.
+
+    `onsets` holds the cumulative start tick of every beat followed by the
+    end of the track, and `measure_starts` the index of the first beat of
+    every measure. Lookups by time are binary searches over these arrays.
+    """
+
+    def __init__(self, onsets: array, measure_starts: array):
+        self.onsets = onsets
+        self.measure_starts = measure_starts
+
+    @classmethod
+    def from_track(
+        cls, track: "PlayableTrack", bar_ticks: int = TICKS_PER_WHOLE
+    ) -> "TickGrid":
+        """Grid of a track, using its own measures or else bars of `bar_ticks`"""
+        onsets = array("i", [0])
+        tick = 0
+        for beat in track.beats:
+            tick += beat.length.ticks
+            onsets.append(tick)
+        if track.measure_starts is not None:
+            measure_starts = array("i", track.measure_starts)
+        else:
+            measure_starts = measure_starts_from_onsets(onsets, bar_ticks)
+        return cls(onsets, measure_starts)
+
+    def __len__(self) -> int:
+        return len(self.onsets) - 1
+
+    @property
+    def total_ticks(self) -> int:
+        return self.onsets[-1]
+
+    def beat_at(self, tick: int) -> int:
+        """Index of the beat sounding at `tick`, len(self) past the end"""
+        if tick >= self.total_ticks:
+            return len(self)
+        return max(bisect_right(self.onsets, tick) - 1, 0)
+
+    def beat_at_time(self, seconds: float, bpm: float) -> int:
+        # bpm counts quarter notes
+        return self.beat_at(int(seconds * bpm * TICKS_PER_WHOLE / 240))
+
+    def seconds(self, beat_index: int, bpm: float) -> float:
+        """Onset of a beat in seconds"""
+        return self.onsets[beat_index] * 240 / (bpm * TICKS_PER_WHOLE)
+
+    def measure_of(self, beat_index: int) -> int:
+        return max(bisect_right(self.measure_starts, beat_index) - 1, 0)
+
+    def next_measure_start(self, beat_index: int) -> int:
+        """First measure start at or after `beat_index`, len(self) if none"""
+        i = bisect_left(self.measure_starts, beat_index)
+        if i == len(self.measure_starts):
+            return len(self)
+        return self.measure_starts[i]
+
+
 @dataclass
 class PlayableTrack:
     beats: List[Beat]
     bpm: int = 120
+    # Index of the first beat of every measure, when the source has measures
+    measure_starts: Optional[List[int]] = None
 
     def __len__(self) -> int:
         return len(self.beats)
 
+    def tick_grid(self, bar_ticks: int = TICKS_PER_WHOLE) -> TickGrid:
+        return TickGrid.from_track(self, bar_ticks)
+
     def to_drum_lang_sequence(self) -> str:
-        # TODO: sort simultaneous hits
-        return "".join(
-            "".join(hit.drum_lang_code for hit in beat.hits)
-            + beat.length.drum_lang_code
-            for beat in self.beats
-        )
+        """Canonical drum lang, simultaneous hits are in registry order"""
+        return "".join(beat.chord.to_drum_lang() for beat in self.beats)
 
     def from_slice(self, start: int, end: int) -> "PlayableTrack":
-        return PlayableTrack(self.beats[start:end], self.bpm)
+        measure_starts = None
+        if self.measure_starts is not None:
+            measure_starts = [
+                i - start for i in self.measure_starts if start <= i < end
+            ]
+        return PlayableTrack(self.beats[start:end], self.bpm, measure_starts)
 
 
 drum_lang_primitives = [
     *drum_sounds.values(),
     *note_lengths.values(),
 ]
+
+# Dense integer id of every primitive, keyed by drum lang code
+primitive_ids = {p.drum_lang_code: i for i, p in enumerate(drum_lang_primitives)}
+primitives_by_code = {p.drum_lang_code: p for p in drum_lang_primitives}
+
+
+def to_code_array(track: FlatTrack) -> array:
+    """Primitive ids of a flat track as a compact byte array"""
+    return array("B", (primitive_ids[p.drum_lang_code] for p in track))
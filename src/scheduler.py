@@ -0,0 +1,211 @@
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from primitives import TICKS_PER_WHOLE, Beat, PlayableTrack
+
+# Called with the beat that is due. Must not block for long, it runs on the
+# scheduler thread and delays every event behind it.
+Trigger = Callable[[Beat], None]
+
+
+@dataclass
+class SchedulerMetrics:
+    """Timing statistics collected while a track plays"""
+
+    events: int = 0
+    # Signed lateness of each trigger in seconds (actual - scheduled)
+    errors: List[float] = field(default_factory=list)
+    # Seconds spent inside the trigger callback
+    overhead: float = 0.0
+
+    def record(self, error: float, overhead: float):
+        self.events += 1
+        self.errors.append(error)
+        self.overhead += overhead
+
+    @property
+    def mean_abs_error(self) -> float:
+        if not self.errors:
+            return 0.0
+        return sum(abs(e) for e in self.errors) / len(self.errors)
+
+    @property
+    def max_abs_error(self) -> float:
+        return max((abs(e) for e in self.errors), default=0.0)
+
+    @property
+    def mean_overhead(self) -> float:
+        return self.overhead / self.events if self.events else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "events": self.events,
+            "mean_abs_error": self.mean_abs_error,
+            "max_abs_error": self.max_abs_error,
+            "overhead": self.overhead,
+            "mean_overhead": self.mean_overhead,
+        }
+
+
+def beat_offsets(track: PlayableTrack) -> List[float]:
+    """Start of every beat in whole notes, plus the end of the track"""
+    # Exact: ticks are integers and TICKS_PER_WHOLE is a power of two
+    return [tick / TICKS_PER_WHOLE for tick in track.tick_grid().onsets]
+
+
+class PlaybackScheduler:
+    """Plays a track against an absolute monotonic timeline.
+
+    Beat onsets are computed from an anchor (clock time, position in whole
+    notes) instead of sleeping for each beat's duration, so trigger cost and
+    sleep jitter never accumulate. A lookahead thread sleeps until an event is
+    close, then spins for the last `spin` seconds to hit it precisely.
+    """
+
+    def __init__(
+        self,
+        trigger: Trigger,
+        lookahead: float = 0.025,
+        spin: float = 0.002,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.trigger = trigger
+        self.lookahead = lookahead
+        self.spin = spin
+        self.clock = clock
+        self.metrics = SchedulerMetrics()
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = True
+        self._track: Optional[PlayableTrack] = None
+        self._offsets: List[float] = []
+        self._next = 0
+        self._bpm = 120.0
+        self._anchor_time = 0.0
+        self._anchor_pos = 0.0
+
+    # Timeline
+
+    def _seconds_per_whole(self) -> float:
+        # bpm counts quarter notes
+        return 4 * 60.0 / self._bpm
+
+    def _time_of(self, pos: float) -> float:
+        return self._anchor_time + (pos - self._anchor_pos) * self._seconds_per_whole()
+
+    def _position_at(self, now: float) -> float:
+        return self._anchor_pos + (now - self._anchor_time) / self._seconds_per_whole()
+
+    # Public API
+
+    @property
+    def playing(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def bpm(self) -> float:
+        return self._bpm
+
+    @property
+    def position(self) -> int:
+        """Index of the next beat to be triggered"""
+        return self._next
+
+    def play(self, track: PlayableTrack, blocking: bool = True, start: int = 0):
+        self.stop()
+        with self._cond:
+            self._track = track
+            self._offsets = beat_offsets(track)
+            self._bpm = float(track.bpm)
+            self._next = min(start, len(track.beats))
+            self._anchor_pos = self._offsets[self._next]
+            self._anchor_time = self.clock()
+            self._stopped = False
+            self.metrics = SchedulerMetrics()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        if blocking:
+            self.wait()
+
+    def wait(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self.wait()
+        self._thread = None
+
+    def seek(self, beat_index: int):
+        """Continue playback from `beat_index` immediately"""
+        with self._cond:
+            self._next = max(0, min(beat_index, len(self._offsets) - 1))
+            self._anchor_pos = self._offsets[self._next]
+            self._anchor_time = self.clock()
+            self._cond.notify_all()
+
+    def seek_time(self, seconds: float):
+        """Continue playback from the beat sounding `seconds` into the track"""
+        with self._cond:
+            position = seconds / self._seconds_per_whole()
+            beat_index = bisect_right(self._offsets, position) - 1
+        self.seek(beat_index)
+
+    def set_bpm(self, bpm: float):
+        """Change tempo without moving the current playback position"""
+        if bpm <= 0:
+            raise ValueError("bpm must be positive")
+        with self._cond:
+            now = self.clock()
+            self._anchor_pos = self._position_at(now)
+            self._anchor_time = now
+            self._bpm = float(bpm)
+            self._cond.notify_all()
+
+    def end_time(self) -> float:
+        """Clock time at which the last beat finishes"""
+        with self._cond:
+            return self._time_of(self._offsets[-1]) if self._offsets else self.clock()
+
+    # Scheduler thread
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped or self._next >= len(self._track.beats):
+                    return
+                index = self._next
+                due = self._time_of(self._offsets[index])
+                wait = due - self.clock()
+                if wait > self.lookahead:
+                    # Far away: sleep, but wake early on stop/seek/tempo change
+                    self._cond.wait(wait - self.lookahead)
+                    continue
+                if wait > self.spin:
+                    # Start over after the wait, a stop, seek or tempo change
+                    # may have moved the event
+                    self._cond.wait(wait - self.spin)
+                    continue
+
+            # At most `spin` seconds, cut short by a stop or seek
+            while self.clock() < due:
+                if self._stopped or self._next != index:
+                    break
+
+            with self._cond:
+                # A seek or tempo change may have landed while spinning
+                if self._stopped or self._next != index:
+                    continue
+                if self._time_of(self._offsets[index]) > self.clock():
+                    continue
+                self._next = index + 1
+
+            before = self.clock()
+            self.trigger(self._track.beats[index])
+            self.metrics.record(before - due, self.clock() - before)
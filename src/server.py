@@ -0,0 +1,495 @@
+"""Long-running infill server over local HTTP or a Unix socket.
+
+The server keeps a grammar warm with every candidate list enumerated up
+front, so answering a query only costs a short best-first search over the
+hole. Requests arriving together are answered as one batch, identical
+queries are answered once, and recent answers are kept in an LRU.
+
+    POST /infill  {"query": "BS3??h3", "top_k": 5}
+                  -> {"fills": [{"fill": "S3", "track": "...", "mdl": 4.2}, ...]}
+    GET  /stats   -> request count and p50/p99 latency in milliseconds
+    GET  /health  -> {"ok": true}
+
+Queries are drum lang strings with one run of `?` marking the hole, as
+accepted by parse_primitives_from_drum_lang.
+
+Start with `python server.py [--address HOST:PORT|PATH] [--grammar FILE]`.
+"""
+
+import argparse
+import heapq
+import http.client
+import json
+import math
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from automaton import SHAPES, HoleContext, shape_successors, step
+from cache import EnumerationCache, enumeration_key
+from distributed import Address, grammar_from_dict, parse_address
+from drum_lang import parse_primitives_from_drum_lang, parse_track_from_drum_lang
+from grammar import Grammar, Production
+from metrics import NULL_METRICS, Metrics
+from primitives import (
+    Hole,
+    Primitive,
+    PrimitiveType,
+    drum_lang_primitives,
+)
+
+MAX_HOLE_LENGTH = 8
+
+
+class LatencyTracker:
+    """Latencies of the last `window` requests"""
+
+    def __init__(self, window: int = 10000):
+        self.samples: deque = deque(maxlen=window)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile in seconds, 0 without samples"""
+        with self._lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return 0.0
+        rank = max(int(round(q / 100 * len(samples))) - 1, 0)
+        return samples[min(rank, len(samples) - 1)]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }
+
+
+def find_hole(track: Sequence) -> Tuple[int, int]:
+    """(start, length) of the single run of holes in a parsed query"""
+    indices = [i for i, p in enumerate(track) if isinstance(p, Hole)]
+    if not indices:
+        raise ValueError("Query has no hole, mark it with ?")
+    start, length = indices[0], len(indices)
+    if indices[-1] != start + length - 1:
+        raise ValueError("Query must have a single run of ? holes")
+    if length > MAX_HOLE_LENGTH:
+        raise ValueError(f"Holes are limited to {MAX_HOLE_LENGTH} primitives")
+    return start, length
+
+
+class InfillEngine:
+    """Ranks fills for drum lang queries against a fixed grammar"""
+
+    def __init__(
+        self,
+        grammar: Optional[Grammar] = None,
+        upper_bound: float = 100,
+        max_expansions: int = 5000,
+        result_cache_size: int = 4096,
+        metrics: Metrics = NULL_METRICS,
+    ):
+        self.grammar = grammar or Grammar.uniform(drum_lang_primitives)
+        self.upper_bound = upper_bound
+        self.max_expansions = max_expansions
+        self.metrics = metrics
+        self.cache = EnumerationCache(maxsize=1024, metrics=metrics)
+        # previous primitive -> sound and length candidates, sorted by MDL
+        self._candidates: Dict[Optional[Primitive], List[Production]] = {}
+        self._min_cost: Optional[Dict[PrimitiveType, float]] = None
+        self._results: "OrderedDict[Tuple[str, int], List[dict]]" = OrderedDict()
+        self.result_cache_size = result_cache_size
+        self.lookups = 0
+        self.result_hits = 0
+        self._lock = threading.Lock()
+
+    def warm(self) -> "InfillEngine":
+        """Enumerate candidates for every previous primitive up front"""
+        previous = [None]
+        if self.grammar.contextual:
+            previous += drum_lang_primitives
+        for p in previous:
+            self.candidates(p)
+        return self
+
+    def candidates(self, previous: Optional[Primitive]) -> List[Production]:
+        key = previous if self.grammar.contextual else None
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            candidates = []
+            for request in PrimitiveType:
+                cache_key = enumeration_key(
+                    self.grammar, request, None, key, upper_bound=self.upper_bound
+                )
+                candidates += self.cache.get_or_compute(
+                    cache_key,
+                    lambda: self.grammar.fill_holes(
+                        request, upper_bound=self.upper_bound, previous=key
+                    ),
+                )
+            candidates.sort(key=lambda c: c[0])
+            self._candidates[key] = candidates
+        return candidates
+
+    def _min_costs(self) -> Dict[PrimitiveType, float]:
+        """Cheapest MDL of each primitive type over every previous primitive"""
+        if self._min_cost is None:
+            self.warm()
+            self._min_cost = {}
+            for candidates in self._candidates.values():
+                for mdl, p in candidates:
+                    current = self._min_cost.get(p.type, math.inf)
+                    self._min_cost[p.type] = min(current, mdl)
+        return self._min_cost
+
+    def fills(
+        self,
+        context: HoleContext,
+        previous: Optional[Primitive],
+        top_k: int,
+    ) -> List[Tuple[float, List[Primitive]]]:
+        """The `top_k` cheapest fills the automaton accepts, best first.
+
+        A* over partial fills: the heuristic is the cheapest way to complete
+        the hole from the shape of the partial fill's automaton state. It
+        never overestimates, so complete fills come out in order of cost.
+        Ties go to the deeper partial fill, which keeps equally likely
+        productions from being expanded breadth first.
+        """
+        min_cost = self._min_costs()
+        head_size = context.head.bit_count()
+        # remaining[j][shape]: least cost of j more primitives from shape
+        remaining = [{s: 0.0 for s in context.viable[0]}]
+        for j in range(1, context.hole_length + 1):
+            costs = {}
+            for shape in SHAPES:
+                options = [
+                    min_cost[kind] + remaining[j - 1][nxt]
+                    for kind, nxt in shape_successors(shape, head_size)
+                    if kind in min_cost and nxt in remaining[j - 1]
+                ]
+                if options:
+                    costs[shape] = min(options)
+            remaining.append(costs)
+
+        results = []
+        n = context.hole_length
+        entry = context.shape(context.entry)
+        if entry not in remaining[n]:
+            return results
+        frontier = [(remaining[n][entry], 0, 0, 0.0, context.entry, ())]
+        counter = 1
+        expansions = 0
+        while frontier and len(results) < top_k and expansions < self.max_expansions:
+            _, _, _, cost, state, filled = heapq.heappop(frontier)
+            if len(filled) == n:
+                results.append((cost, list(filled)))
+                continue
+            expansions += 1
+            left = remaining[n - len(filled) - 1]
+            last = filled[-1] if filled else previous
+            for mdl, p in self.candidates(last):
+                # The state is the beat's set of sounds, so a sound already
+                # in the beat or added to it by the suffix is ruled out here
+                nxt = step(state, p)
+                if nxt is None or context.shape(nxt) not in left:
+                    continue
+                g = cost + mdl
+                depth = -(len(filled) + 1)
+                h = left[context.shape(nxt)]
+                heapq.heappush(frontier, (g + h, depth, counter, g, nxt, (*filled, p)))
+                counter += 1
+        self.metrics.inc("infill_expansions", expansions)
+        return results
+
+    def infill(self, query: str, top_k: int = 5) -> List[dict]:
+        key = (query, top_k)
+        with self._lock:
+            self.lookups += 1
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.result_hits += 1
+                self.metrics.inc("infill_result_cache_hits")
+                return self._results[key]
+
+        track = parse_primitives_from_drum_lang(query)
+        start, length = find_hole(track)
+        context = HoleContext.from_track(track, start, length)
+        if context.entry is None:
+            raise ValueError("The track before the hole is not valid drum lang")
+        previous = track[start - 1] if start > 0 else None
+        prefix, suffix = query[:start], query[start + length :]
+        answer = []
+        for cost, fill in self.fills(context, previous, top_k):
+            code = "".join(p.drum_lang_code for p in fill)
+            # Simultaneous hits in registry order, whatever order the fill used
+            filled = parse_track_from_drum_lang(prefix + code + suffix)
+            track_code = filled.to_drum_lang_sequence()
+            answer.append({"fill": code, "track": track_code, "mdl": cost})
+
+        with self._lock:
+            self._results[key] = answer
+            while len(self._results) > self.result_cache_size:
+                self._results.popitem(last=False)
+        return answer
+
+
+class Batcher:
+    """Answers queries on one thread, in batches of concurrent requests.
+
+    A batch is whatever queued up while the previous one was answered, plus
+    what arrives within `batch_window` seconds. The default window of 0
+    never delays a request that arrives alone.
+    """
+
+    def __init__(
+        self,
+        engine: InfillEngine,
+        max_batch: int = 64,
+        batch_window: float = 0.0,
+    ):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, top_k: int) -> Future:
+        future: Future = Future()
+        self._queue.put((query, top_k, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self.engine.metrics.observe("infill_batch_size", len(batch))
+
+            # Identical queries in a batch are answered once
+            answers: Dict[Tuple[str, int], object] = {}
+            for query, top_k, future in batch:
+                key = (query, top_k)
+                if key not in answers:
+                    try:
+                        answers[key] = self.engine.infill(query, top_k)
+                    except Exception as e:
+                        answers[key] = e
+                answer = answers[key]
+                if isinstance(answer, Exception):
+                    future.set_exception(answer)
+                else:
+                    future.set_result(answer)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, clients reuse connections
+
+    def setup(self):
+        super().setup()
+        if self.connection.family != socket.AF_UNIX:
+            # Replies are small, send them without waiting for an ACK
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server: InfillServer = self.server.infill_server
+        if self.path == "/health":
+            self._reply(200, {"ok": True})
+        elif self.path == "/stats":
+            self._reply(200, server.stats())
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        server: InfillServer = self.server.infill_server
+        start = time.perf_counter()
+        length = int(self.headers.get("Content-Length", 0))
+        if self.path != "/infill":
+            self.rfile.read(length)
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length))
+            query = request["query"]
+            top_k = int(request.get("top_k", 5))
+            fills = server.batcher.submit(query, top_k).result()
+        except (KeyError, TypeError, ValueError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, {"fills": fills})
+        elapsed = time.perf_counter() - start
+        server.latency.observe(elapsed)
+        server.engine.metrics.observe("infill_latency_seconds", elapsed)
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+class InfillServer:
+    """HTTP front end of a warm InfillEngine"""
+
+    def __init__(
+        self,
+        engine: InfillEngine,
+        address: Address = ("127.0.0.1", 0),
+        max_batch: int = 64,
+        batch_window: float = 0.0,
+    ):
+        self.engine = engine
+        self.latency = LatencyTracker()
+        self.batcher = Batcher(engine, max_batch, batch_window)
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = _UnixHTTPServer(address, _Handler)
+        else:
+            self.server = ThreadingHTTPServer(address, _Handler)
+        self.server.infill_server = self
+        self.address: Address = self.server.server_address
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "InfillServer":
+        self.engine.warm()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.engine.warm()
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.batcher.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def stats(self) -> dict:
+        return {
+            **self.latency.summary(),
+            "result_cache_hit_rate": (
+                self.engine.result_hits / self.engine.lookups
+                if self.engine.lookups
+                else 0.0
+            ),
+        }
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 10.0):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class InfillClient:
+    """Keeps one connection open to an InfillServer"""
+
+    def __init__(self, address: Address, timeout: float = 10.0):
+        if isinstance(address, str):
+            self.connection = _UnixHTTPConnection(address, timeout)
+        else:
+            host, port = address[:2]
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data else {}
+        self.connection.request(method, path, body=data, headers=headers)
+        response = self.connection.getresponse()
+        payload = json.loads(response.read())
+        if response.status != 200:
+            raise ValueError(payload.get("error", f"HTTP {response.status}"))
+        return payload
+
+    def infill(self, query: str, top_k: int = 5) -> List[dict]:
+        body = {"query": query, "top_k": top_k}
+        return self._request("POST", "/infill", body)["fills"]
+
+    def stats(self) -> dict:
+        return self._request("GET", "/stats")
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve drum infills")
+    parser.add_argument(
+        "--address", default="127.0.0.1:8765", help="HOST:PORT or Unix socket path"
+    )
+    parser.add_argument(
+        "--grammar",
+        help="Grammar JSON in the distributed.grammar_to_dict format, "
+        "a uniform grammar if omitted",
+    )
+    args = parser.parse_args()
+
+    grammar = None
+    if args.grammar:
+        with open(args.grammar) as f:
+            grammar = grammar_from_dict(json.load(f))
+    server = InfillServer(InfillEngine(grammar), parse_address(args.address))
+    print(f"Serving infills on {server.address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -47,9 +47,12 @@ def parse_flat_track_from_tab(file_path: Path) -> Tuple[FlatTrack, int]:
 def parse_playable_track_from_tab(file_path: Path) -> PlayableTrack:
     measures, bpm = get_drums(file_path)
     beats: List[Beat] = []
+    measure_starts: List[int] = []
     # Process all measures in the drum track
     for measure in measures:
         voice_one = measure.voices[0]
+        if voice_one.beats:
+            measure_starts.append(len(beats))
         for beat in voice_one.beats:
             length = NoteLength.from_gp_value(
                 beat.duration.value, beat.duration.isDotted
@@ -58,9 +61,11 @@ def parse_playable_track_from_tab(file_path: Path) -> PlayableTrack:
             if beat.notes:
                 for note in beat.notes:
                     sound = DrumSound.from_midi_value(note.value)
-                    hits.append(sound)
+                    # Several MIDI notes can map to the same sound
+                    if sound not in hits:
+                        hits.append(sound)
             else:
                 hits.append(Rest())
             beats.append(Beat(hits=hits, length=length))
-    track = PlayableTrack(beats=beats, bpm=bpm)
+    track = PlayableTrack(beats=beats, bpm=bpm, measure_starts=measure_starts)
     return track
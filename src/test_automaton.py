@@ -0,0 +1,100 @@
+import random
+import unittest
+from automaton import START, HoleContext, accepts, run
+from drum_lang import (
+    parse_primitives_from_drum_lang,
+    parse_track_from_drum_lang,
+    primitives_to_track,
+)
+from grammar import Grammar
+from primitives import (
+    QUARTER,
+    PrimitiveType,
+    DrumSound,
+    drum_lang_primitives,
+)
+
+SNARE = DrumSound.from_drum_lang_code("S")
+HIHAT = DrumSound.from_drum_lang_code("h")
+
+
+def context(sequence: str) -> HoleContext:
+    track = parse_primitives_from_drum_lang(sequence)
+    start = sequence.index("?")
+    return HoleContext.from_track(track, start, sequence.count("?"))
+
+
+class TestAutomaton(unittest.TestCase):
+    def test_accepts_matches_parser(self):
+        sequences = ["S5", "SHBh5S3", "", "S", "5", "SSSSS5", "S55", "SHBh5"]
+        for sequence in sequences + ["SHBhC5", "SS5", "HSH3", "S3hh3"]:
+            try:
+                parse_track_from_drum_lang(sequence)
+                primitives_to_track(parse_primitives_from_drum_lang(sequence))
+                valid = True
+            except (ValueError, IndexError):
+                valid = False
+            primitives = parse_primitives_from_drum_lang(sequence)
+            self.assertEqual(accepts(primitives), valid, sequence)
+
+    def test_live_shapes(self):
+        # suffix "S5" is accepted from any state with room for one more hit
+        # that does not already hold the snare
+        self.assertEqual(
+            context("?S5").viable[0], {(0, False), (1, False), (2, False), (3, False)}
+        )
+        self.assertEqual(
+            context("S?5").viable[0], {(1, False), (2, False), (3, False), (4, False)}
+        )
+
+    def test_shapes_match_automaton(self):
+        rng = random.Random(0)
+        sounds = [p for p in drum_lang_primitives if p.type == PrimitiveType.SOUND]
+        for suffix in ["S5", "5", "hS3B5", "SS5", "S", "Sh3S", ""]:
+            ctx = context("?" + suffix)
+            primitives = parse_primitives_from_drum_lang(suffix)
+            for _ in range(200):
+                state = run(START, rng.sample(sounds, rng.randint(0, 4)))
+                live = run(state, primitives) == START
+                self.assertEqual(ctx.shape(state) in ctx.viable[0], live, suffix)
+
+    def test_sound_hole(self):
+        ctx = context("HB?5")
+        self.assertTrue(ctx.allows(SNARE))
+        self.assertFalse(ctx.allows(QUARTER))
+        # Beat already has four hits
+        self.assertFalse(context("SHBh?5").allows(SNARE))
+        # A sound may not repeat in a beat, before or after the hole
+        self.assertFalse(context("SHB?5").allows(SNARE))
+        self.assertFalse(context("?S5").allows(SNARE))
+
+    def test_length_hole(self):
+        ctx = context("S?H5")
+        self.assertTrue(ctx.allows(QUARTER))
+        # Another hit in the same beat is structurally fine too, as long as
+        # it does not repeat one
+        self.assertTrue(ctx.allows(HIHAT))
+        self.assertFalse(ctx.allows(SNARE))
+        # A length right after a length closes an empty beat
+        self.assertFalse(context("S5?S5").allows(QUARTER))
+
+    def test_long_hole(self):
+        ctx = context("S5??")
+        self.assertTrue(ctx.allows(SNARE))
+        self.assertFalse(ctx.allows(QUARTER))
+        self.assertTrue(ctx.allows(QUARTER, filled=[SNARE]))
+        self.assertFalse(ctx.allows(SNARE, filled=[SNARE]))
+        self.assertTrue(ctx.accepts([SNARE, QUARTER]))
+
+    def test_fill_holes_prunes(self):
+        grammar = Grammar.uniform(drum_lang_primitives)
+        full = grammar.fill_holes(PrimitiveType.LENGTH)
+        pruned = grammar.fill_holes(
+            PrimitiveType.LENGTH, contexts=[context("S5?S5")]
+        )
+        self.assertGreater(len(full), 0)
+        self.assertEqual(pruned, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import tempfile
+import unittest
+from pathlib import Path
+from bench import DEFAULT_BASELINE, benchmarks, compare, main, run_benchmark
+
+
+def results(**medians):
+    return {"results": {name: {"median": m} for name, m in medians.items()}}
+
+
+class TestBench(unittest.TestCase):
+    def test_compare_flags_regressions(self):
+        baseline = results(parse=1.0, fill=1.0, render=1.0)
+        current = results(parse=1.1, fill=1.5, new=9.0)
+        self.assertEqual(compare(current, baseline, threshold=0.2), ["fill"])
+
+    def test_baseline(self):
+        self.assertTrue(DEFAULT_BASELINE.exists())
+        with tempfile.TemporaryDirectory() as tmp:
+            missing = Path(tmp) / "missing.json"
+            self.assertEqual(main(["parse_track", "--baseline", str(missing)]), 2)
+            # Writing the baseline creates it, comparing against it then passes
+            args = ["parse_track", "--baseline", str(missing)]
+            self.assertEqual(main([*args, "--out", str(missing)]), 0)
+            self.assertTrue(missing.exists())
+            self.assertEqual(main([*args, "--threshold", "100"]), 0)
+
+    def test_run_benchmark(self):
+        result = run_benchmark(benchmarks["parse_track"])
+        self.assertGreater(result["units_per_sec"], 0)
+        self.assertEqual(result["units"], 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+from cache import EnumerationCache, enumeration_key
+from dataset import InfillTask
+from drum_lang import parse_primitives_from_drum_lang
+from generator import generate_tracks
+from grammar import ContextualGrammar, Grammar
+from metrics import Metrics
+from primitives import PrimitiveType, drum_lang_primitives
+
+
+class TestEnumerationCache(unittest.TestCase):
+    def setUp(self):
+        self.grammar = Grammar.uniform(drum_lang_primitives)
+
+    def test_key(self):
+        key = enumeration_key(self.grammar, PrimitiveType.SOUND)
+        same = Grammar.uniform(drum_lang_primitives)
+        self.assertEqual(key, enumeration_key(same, PrimitiveType.SOUND))
+        self.assertNotEqual(key, enumeration_key(self.grammar, PrimitiveType.LENGTH))
+        self.assertNotEqual(
+            key, enumeration_key(self.grammar, PrimitiveType.SOUND, upper_bound=1)
+        )
+        contextual = ContextualGrammar.uniform(drum_lang_primitives)
+        self.assertNotEqual(key, enumeration_key(contextual, PrimitiveType.SOUND))
+
+    def test_lru_eviction(self):
+        cache = EnumerationCache(maxsize=2)
+        cache.put("a", [])
+        cache.put("b", [])
+        cache.get("a")
+        cache.put("c", [])
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_disk_tier(self):
+        value = self.grammar.fill_holes(PrimitiveType.LENGTH)
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics = Metrics()
+            cache = EnumerationCache(maxsize=1, directory=tmp, metrics=metrics)
+            cache.put("a", value)
+            cache.put("b", [])
+            self.assertNotIn("a", cache.entries)
+            self.assertEqual(cache.get("a"), value)
+            self.assertEqual(metrics.counters["enumeration_cache_disk_hits"], 1)
+            self.assertEqual(EnumerationCache(directory=tmp).get("b"), [])
+
+    def test_generate_tracks_reuses_enumerations(self):
+        track = parse_primitives_from_drum_lang("S3h3B3h3S3")
+        tasks = [InfillTask(track, hole_start=2, hole_length=1)]
+        cache = EnumerationCache()
+        first = generate_tracks(self.grammar, tasks, cache=cache)
+        second = generate_tracks(self.grammar, tasks, cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
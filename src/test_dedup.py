@@ -0,0 +1,60 @@
+import random
+import unittest
+from dataset import generate_tasks_from_tracks
+from dedup import MinHasher, RollingHash, SegmentDeduplicator, shingles, similarity
+from drum_lang import parse_track_from_drum_lang
+
+
+class TestDedup(unittest.TestCase):
+    def test_rolling_hash_slices(self):
+        codes = [3, 0, 5, 3, 0, 5, 7]
+        hashes = RollingHash(codes)
+        self.assertEqual(hashes(0, 3), hashes(3, 6))
+        self.assertEqual(hashes(0, 3), RollingHash(codes[:3])())
+        self.assertNotEqual(hashes(0, 3), hashes(1, 4))
+        # Leading zero codes are not ignored
+        self.assertNotEqual(RollingHash([0, 1])(), RollingHash([1])())
+
+    def test_shingles_match_direct_hashes(self):
+        codes = [1, 2, 3, 4, 5, 6]
+        hashes = RollingHash(codes)
+        self.assertEqual(shingles(codes, 3), [hashes(i, i + 3) for i in range(4)])
+
+    def test_exact_weights(self):
+        dedup = SegmentDeduplicator()
+        for key, codes in [("a", [1, 2, 3]), ("b", [1, 2, 3]), ("c", [3, 2, 1])]:
+            dedup.add(key, codes)
+        self.assertEqual(dedup.items(), [("a", 2), ("c", 1)])
+
+    def test_near_duplicates(self):
+        rng = random.Random(0)
+        base = [rng.randrange(40) for _ in range(200)]
+        variant = list(base)
+        variant[100] = (variant[100] + 1) % 40
+        other = [rng.randrange(40) for _ in range(200)]
+
+        hasher = MinHasher()
+        self.assertGreater(
+            similarity(hasher.signature(base), hasher.signature(variant)), 0.8
+        )
+
+        dedup = SegmentDeduplicator(near_duplicates=True, threshold=0.8)
+        for key, codes in [("base", base), ("variant", variant), ("other", other)]:
+            dedup.add(key, codes)
+        self.assertEqual(dedup.items(), [("base", 2), ("other", 1)])
+
+    def test_generate_tasks_weights(self):
+        groove = parse_track_from_drum_lang("Bh3h3Sh3h3" * 12)
+        random.seed(0)
+        plain = generate_tasks_from_tracks([groove] * 3, 1000, 4, 4)
+        random.seed(0)
+        weighted = generate_tasks_from_tracks([groove] * 3, 1000, 4, 4, dedup="exact")
+        self.assertLess(len(weighted), len(plain))
+        # 3 tracks x 12 segments of the same 4 beats
+        self.assertEqual({t.weight for t in weighted}, {36})
+        with self.assertRaises(ValueError):
+            generate_tasks_from_tracks([groove], 10, dedup="fuzzy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import socket
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from dataset import InfillTask
+from distributed import (
+    Coordinator,
+    grammar_from_dict,
+    grammar_to_dict,
+    run_worker,
+    task_from_dict,
+    task_to_dict,
+)
+from drum_lang import parse_primitives_from_drum_lang
+from grammar import ContextualGrammar, Grammar
+from primitives import drum_lang_primitives
+
+
+def make_tasks():
+    track = parse_primitives_from_drum_lang("Bh3h3Sh3h3Bh3Bh3Sh3h3")
+    return [InfillTask(track, hole_start=i, hole_length=1) for i in range(0, 20, 2)]
+
+
+def start_workers(address, count: int, **kwargs):
+    threads = [
+        threading.Thread(target=run_worker, args=(address,), kwargs=kwargs, daemon=True)
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.grammar = Grammar.uniform(drum_lang_primitives)
+        self.tasks = make_tasks()
+
+    def check_solved(self, frontiers, tasks=None):
+        for task in tasks or self.tasks:
+            tracks = [track for _, track in frontiers[task.task_signature]]
+            self.assertEqual(tracks, [task.to_drum_lang_string()])
+
+    def test_serialization(self):
+        contextual = ContextualGrammar.uniform(drum_lang_primitives)
+        for grammar in (self.grammar, contextual):
+            data = json.loads(json.dumps(grammar_to_dict(grammar)))
+            restored = grammar_from_dict(data)
+            self.assertEqual(restored.content_hash(), grammar.content_hash())
+        task = task_from_dict(task_to_dict(self.tasks[3]))
+        self.assertEqual(task.task_signature, self.tasks[3].task_signature)
+
+    def test_workers_on_localhost(self):
+        coordinator = Coordinator().start()
+        try:
+            coordinator.submit(self.grammar, self.tasks, batch_size=2)
+            start_workers(coordinator.address, 3)
+            self.check_solved(coordinator.wait(timeout=20))
+        finally:
+            coordinator.shutdown()
+
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            address = str(Path(tmp) / "coordinator.sock")
+            coordinator = Coordinator(address).start()
+            try:
+                coordinator.submit(self.grammar, self.tasks, batch_size=4)
+                start_workers(address, 2)
+                self.check_solved(coordinator.wait(timeout=20))
+            finally:
+                coordinator.shutdown()
+
+    def take_job(self, address) -> socket.socket:
+        sock = socket.create_connection(address)
+        sock.sendall(b'{"type": "hello", "worker": "doomed"}\n{"type": "request"}\n')
+        reply = json.loads(sock.makefile("rb").readline())
+        self.assertEqual(reply["type"], "job")
+        return sock
+
+    def test_reassigns_job_of_disconnected_worker(self):
+        coordinator = Coordinator().start()
+        try:
+            tasks = self.tasks[:1]
+            (job_id,) = coordinator.submit(self.grammar, tasks)
+            self.take_job(coordinator.address).close()
+            start_workers(coordinator.address, 1)
+            self.check_solved(coordinator.wait(timeout=20), tasks)
+            self.assertEqual(coordinator.job(job_id).attempts, 2)
+        finally:
+            coordinator.shutdown()
+
+    def test_reassigns_job_after_missed_heartbeats(self):
+        coordinator = Coordinator(heartbeat_timeout=0.3).start()
+        try:
+            tasks = self.tasks[:1]
+            (job_id,) = coordinator.submit(self.grammar, tasks)
+            silent = self.take_job(coordinator.address)
+            start_workers(coordinator.address, 1, heartbeat_interval=0.05)
+            self.check_solved(coordinator.wait(timeout=20), tasks)
+            self.assertEqual(coordinator.job(job_id).attempts, 2)
+            silent.close()
+        finally:
+            coordinator.shutdown()
+
+    def test_rejects_bad_messages(self):
+        coordinator = Coordinator().start()
+        try:
+            tasks = self.tasks[:1]
+            (job_id,) = coordinator.submit(self.grammar, tasks)
+            sock = socket.create_connection(coordinator.address)
+            reader = sock.makefile("rb")
+            for line in (b'{"type": "request"}', b"not json", b'{"type": "hello"}'):
+                sock.sendall(line + b"\n")
+                self.assertEqual(json.loads(reader.readline())["type"], "error")
+            # The connection survives and the job was never handed out
+            sock.sendall(b'{"type": "hello", "worker": "late"}\n{"type": "request"}\n')
+            self.assertEqual(json.loads(reader.readline())["job"], job_id)
+            reader.close()
+            sock.close()
+            start_workers(coordinator.address, 1)
+            self.check_solved(coordinator.wait(timeout=20), tasks)
+        finally:
+            coordinator.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,11 @@
 import unittest
-from drum_lang import parse_primitives_from_drum_lang, parse_track_from_drum_lang
+from drum_lang import (
+    ParseState,
+    parse_primitives_from_drum_lang,
+    parse_track_from_drum_lang,
+    primitives_to_track,
+    resume_parse,
+)
 from primitives import (
     DOTTED_HALF,
     DOTTED_SIXTEENTH,
@@ -57,6 +63,44 @@ class TestDrumLang(unittest.TestCase):
         track = parse_track_from_drum_lang("S2H2")
         self.assertEqual(track.to_drum_lang_sequence(), "S2H2")
 
+    def test_canonical_hit_order(self):
+        """Test that simultaneous hits serialize the same in any order"""
+        a = parse_track_from_drum_lang("hSB3")
+        b = parse_track_from_drum_lang("BhS3")
+        self.assertEqual(a.to_drum_lang_sequence(), b.to_drum_lang_sequence())
+        self.assertEqual(a.beats[0].chord, b.beats[0].chord)
+        self.assertEqual(a.to_drum_lang_sequence(), "BSh3")
+
+    def test_chord(self):
+        """Test chord set operations and popcount hit limit"""
+        chord = parse_track_from_drum_lang("BSh3").beats[0].chord
+        other = parse_track_from_drum_lang("Bh5").beats[0].chord
+        self.assertEqual(len(chord), 3)
+        self.assertIn(DrumSound.from_drum_lang_code("S"), chord)
+        self.assertAlmostEqual(chord.similarity(other), 2 / 3)
+        self.assertNotEqual(chord.key, other.key)
+        self.assertEqual(chord.to_beat().chord, chord)
+        # Set operations give chords, so they compose
+        third = parse_track_from_drum_lang("S3").beats[0].chord
+        self.assertEqual(chord.union(other).intersection(third).to_drum_lang(), "S3")
+        self.assertEqual(len(chord.intersection(other)), 2)
+        with self.assertRaises(ValueError):
+            primitives_to_track(parse_primitives_from_drum_lang("BShoC3"))
+
+    def test_repeated_hit(self):
+        """Test that every parser rejects a sound repeated within a beat"""
+        for sequence in ["SS5", "hSh3", "S5BRR3"]:
+            primitives = parse_primitives_from_drum_lang(sequence)
+            with self.assertRaises(ValueError):
+                parse_track_from_drum_lang(sequence)
+            with self.assertRaises(ValueError):
+                primitives_to_track(primitives)
+            with self.assertRaises(ValueError):
+                resume_parse(ParseState(), primitives)
+        # The same sound in consecutive beats is fine
+        track = parse_track_from_drum_lang("S5S5")
+        self.assertEqual(track.to_drum_lang_sequence(), "S5S5")
+
     def test_occlusion(self):
         """Test that occlusion is parsed correctly"""
         primitives = parse_primitives_from_drum_lang("S2?2")
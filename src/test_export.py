@@ -0,0 +1,53 @@
+import math
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from dataset import InfillTask
+from drum_lang import parse_primitives_from_drum_lang
+from export import decode, export_tasks, load_chunk, load_meta
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        track = parse_primitives_from_drum_lang("Bh3Sh3Bh3Sh3")
+        self.tasks = [
+            InfillTask(track, hole_start=i, hole_length=2, weight=i + 1)
+            for i in range(5)
+        ]
+        self.frontiers = {self.tasks[1].task_signature: [(-3.5, "x"), (-2.0, "y")]}
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            rows = export_tasks(self.tasks, tmp, self.frontiers, chunk_size=2)
+            self.assertEqual(rows, 5)
+            meta = load_meta(tmp)
+            self.assertEqual([c["rows"] for c in meta["chunks"]], [2, 2, 1])
+
+            chunk = load_chunk(tmp, meta["chunks"][0]["name"])
+            offsets = chunk["code_offsets"]
+            codes = chunk["codes"][offsets[0] : offsets[1]]
+            self.assertEqual(decode(codes), "Bh3Sh3Bh3Sh3")
+            self.assertEqual(list(chunk["hole_start"]), [0, 1])
+            self.assertEqual(list(chunk["weight"]), [1, 2])
+            answers = chunk["answer_offsets"]
+            answer = chunk["answer_codes"][answers[1] : answers[2]]
+            self.assertEqual(decode(answer), "h3")
+            self.assertEqual(list(chunk["num_solutions"]), [0, 2])
+            self.assertTrue(math.isnan(chunk["prior"][0]))
+            self.assertEqual(chunk["prior"][1], -2.0)
+            self.assertEqual(list(chunk["likelihood"]), [float("-inf"), 0.0])
+
+    def test_npy_header(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            export_tasks(self.tasks[:1], tmp)
+            data = (Path(tmp) / "chunk_00000" / "prior.npy").read_bytes()
+            self.assertEqual(data[:8], b"\x93NUMPY\x01\x00")
+            (header_length,) = struct.unpack("<H", data[8:10])
+            self.assertEqual((10 + header_length) % 64, 0)
+            self.assertIn(b"'descr': '<f8'", data[10 : 10 + header_length])
+            self.assertEqual(len(data), 10 + header_length + 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
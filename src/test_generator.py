@@ -0,0 +1,89 @@
+import random
+import unittest
+from dataset import InfillTask, is_valid_segment
+from drum_lang import parse_primitives_from_drum_lang
+from generator import (
+    HoleVerifier,
+    enumerate_solutions,
+    generate_tracks,
+    score_track,
+)
+from grammar import Grammar
+from metrics import Metrics
+from primitives import drum_lang_primitives
+
+
+class TestGenerator(unittest.TestCase):
+    def test_verifier_matches_full_reparse(self):
+        rng = random.Random(0)
+        track = parse_primitives_from_drum_lang("SH3hB3R5hSo3B1C2")
+        for start in range(len(track) - 1):
+            for length in (1, 2):
+                task = InfillTask(track, hole_start=start, hole_length=length)
+                verifier = HoleVerifier(task)
+                answer = track[start : start + length]
+                self.assertTrue(verifier.score(answer)[0])
+                for _ in range(20):
+                    fill = rng.choices(drum_lang_primitives, k=length)
+                    string = verifier.track_string(fill)
+                    self.assertEqual(
+                        verifier.score(fill)[0], score_track(string, task)[0]
+                    )
+
+    def test_crowded_beat_is_unsolvable(self):
+        # Five hits in the first beat, over the limit the automaton allows
+        crowded = parse_primitives_from_drum_lang("SHBhC3S3h3B3")
+        self.assertFalse(is_valid_segment(crowded, min_beats=2))
+        track = parse_primitives_from_drum_lang("S3h3B3h3S3")
+        tasks = [
+            InfillTask(crowded, hole_start=8, hole_length=1),
+            InfillTask(track, hole_start=2, hole_length=1),
+        ]
+        self.assertIsNone(HoleVerifier(tasks[0]).answer)
+        results = generate_tracks(Grammar.uniform(drum_lang_primitives), tasks)
+        self.assertEqual(results[tasks[0].task_signature], [])
+        self.assertTrue(results[tasks[1].task_signature])
+
+    def test_generate_tracks_solves_tasks(self):
+        track = parse_primitives_from_drum_lang("S3h3B3h3S3")
+        tasks = [InfillTask(track, hole_start=i, hole_length=1) for i in (0, 2, 4)]
+        grammar = Grammar.uniform(drum_lang_primitives)
+        results = generate_tracks(grammar, tasks)
+        for task in tasks:
+            tracks = [t for _, t in results[task.task_signature]]
+            self.assertEqual(tracks, [task.to_drum_lang_string()])
+
+    def test_anytime_solutions_stream(self):
+        track = parse_primitives_from_drum_lang("S3h3B3h3S3")
+        tasks = [InfillTask(track, hole_start=i, hole_length=1) for i in (0, 2, 4)]
+        grammar = Grammar.uniform(drum_lang_primitives)
+        metrics = Metrics()
+        solutions = enumerate_solutions(grammar, tasks, metrics=metrics)
+        first = next(solutions)
+        self.assertIn(first.task_signature, [t.task_signature for t in tasks])
+        self.assertLess(first.elapsed, 1.0)
+        rest = list(solutions)
+        self.assertEqual(len(rest), 2)
+        # Search stops once every task is solved, before the last candidate
+        self.assertLess(metrics.counters["programs_total"], 28)
+
+    def test_timeout(self):
+        track = parse_primitives_from_drum_lang("S3h3B3h3S3")
+        tasks = [InfillTask(track, hole_start=0, hole_length=1)]
+        grammar = Grammar.uniform(drum_lang_primitives)
+        metrics = Metrics()
+        seen = []
+        results = generate_tracks(
+            grammar,
+            tasks,
+            timeout_seconds=0,
+            metrics=metrics,
+            on_solution=seen.append,
+        )
+        self.assertEqual(seen, [])
+        self.assertEqual(results, {tasks[0].task_signature: []})
+        self.assertEqual(metrics.counters["timeouts"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
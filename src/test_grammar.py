@@ -0,0 +1,61 @@
+import math
+import unittest
+from dataset import InfillTask
+from drum_lang import parse_primitives_from_drum_lang
+from generator import generate_tracks
+from grammar import ContextualGrammar, Grammar
+from metrics import Metrics
+from primitives import DrumSound, PrimitiveType, drum_lang_primitives
+
+KICK = DrumSound.from_drum_lang_code("B")
+SNARE = DrumSound.from_drum_lang_code("S")
+HAT = DrumSound.from_drum_lang_code("h")
+
+
+class TestContextualGrammar(unittest.TestCase):
+    def setUp(self):
+        corpus = [parse_primitives_from_drum_lang("Bh3Sh3" * 8)]
+        self.grammar = ContextualGrammar.from_tracks(drum_lang_primitives, corpus)
+
+    def test_candidates_are_normalized(self):
+        for previous in (None, KICK, HAT):
+            candidates = self.grammar.get_candidates(PrimitiveType.SOUND, previous)
+            self.assertAlmostEqual(
+                math.log(sum(math.exp(lp) for lp, _ in candidates)), 0.0
+            )
+            self.assertTrue(all(p.type == PrimitiveType.SOUND for _, p in candidates))
+
+    def test_ranks_by_previous_primitive(self):
+        top = lambda previous: self.grammar.fill_holes(
+            PrimitiveType.SOUND, previous=previous
+        )[0][1]
+        self.assertEqual(top(KICK), HAT)
+        self.assertEqual(top(None), KICK)
+
+    def test_uniform_matches_grammar(self):
+        uniform = ContextualGrammar.uniform(drum_lang_primitives)
+        plain = Grammar.uniform(drum_lang_primitives)
+        self.assertEqual(
+            [p for _, p in uniform.fill_holes(PrimitiveType.LENGTH, previous=KICK)],
+            [p for _, p in plain.fill_holes(PrimitiveType.LENGTH)],
+        )
+
+    def test_log_likelihood(self):
+        likely = parse_primitives_from_drum_lang("Bh3Sh3")
+        unlikely = parse_primitives_from_drum_lang("SB3hS3")
+        self.assertGreater(
+            self.grammar.log_likelihood(likely), self.grammar.log_likelihood(unlikely)
+        )
+        self.assertEqual(sum(self.grammar.transition_counts(likely).values()), 6)
+
+    def test_generate_tracks_solves_first(self):
+        track = parse_primitives_from_drum_lang("Bh3Sh3Bh3Sh3")
+        task = InfillTask(track, hole_start=7, hole_length=1)
+        metrics = Metrics()
+        results = generate_tracks(self.grammar, [task], metrics=metrics)
+        self.assertEqual(len(results[task.task_signature]), 1)
+        self.assertEqual(metrics.histograms["candidates_per_task"].max, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
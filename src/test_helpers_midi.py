@@ -0,0 +1,31 @@
+"""Minimal standard MIDI file writer for building test grooves"""
+
+import struct
+from pathlib import Path
+
+TPQ = 480
+
+
+def varlen(value: int) -> bytes:
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def chunk(name: bytes, events: list) -> bytes:
+    data = b"".join(varlen(delta) + event for delta, event in events)
+    data += varlen(0) + b"\xff\x2f\x00"
+    return name + struct.pack(">I", len(data)) + data
+
+
+def write_groove(path: Path, beats: int):
+    """Alternating kick and snare quarter notes"""
+    events = []
+    for i in range(beats):
+        note = 36 if i % 2 == 0 else 38
+        events.append((0 if i == 0 else TPQ, bytes([0x99, note, 100])))
+    header = b"MThd" + struct.pack(">IHHH", 6, 0, 1, TPQ)
+    path.write_bytes(header + chunk(b"MTrk", events))
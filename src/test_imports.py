@@ -0,0 +1,25 @@
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+
+class TestHeadlessImports(unittest.TestCase):
+    def test_no_audio_dependency(self):
+        """Data, grammar and enumeration modules must not import pygame"""
+        code = (
+            "import sys\n"
+            "import dataset, drum_lang, generator, grammar, train\n"
+            "assert 'pygame' not in sys.modules, 'pygame was imported'\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from manifest import DatasetManifest
+from test_helpers_midi import write_groove
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.gp_dir = self.root / "gp"
+        self.gp_dir.mkdir()
+        for i in range(3):
+            write_groove(self.gp_dir / f"groove_{i}.mid", 16 + 8 * i)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def files(self):
+        return sorted(self.gp_dir.glob("*.mid"))
+
+    def manifest(self, **kwargs):
+        return DatasetManifest(
+            self.root / "tasks", min_beats=4, max_beats=8, **kwargs
+        )
+
+    def test_initial_refresh(self):
+        manifest = self.manifest()
+        result = manifest.refresh(self.files())
+        self.assertEqual(len(result.added), 3)
+        tasks = manifest.tasks()
+        self.assertTrue(tasks)
+        self.assertEqual([t.task_id for t in tasks], manifest.task_ids())
+        # Files can share segments, those tasks are listed once
+        self.assertGreaterEqual(result.tasks_added, len(manifest.task_ids()))
+
+    def test_refresh_is_incremental(self):
+        self.manifest().refresh(self.files())
+        ids = set(self.manifest().task_ids())
+
+        # Reloaded from disk, nothing to do
+        manifest = self.manifest()
+        result = manifest.refresh(self.files())
+        self.assertEqual(len(result.unchanged), 3)
+        self.assertEqual(result.tasks_added + result.tasks_removed, 0)
+        self.assertEqual(set(manifest.task_ids()), ids)
+
+        # A new file only adds its own tasks
+        write_groove(self.gp_dir / "groove_new.mid", 40)
+        result = manifest.refresh(self.files())
+        self.assertEqual(result.added, [str(self.gp_dir / "groove_new.mid")])
+        self.assertTrue(ids < set(manifest.task_ids()))
+
+        # Deleting it drops exactly those tasks again
+        os.unlink(self.gp_dir / "groove_new.mid")
+        result = manifest.refresh(self.files())
+        self.assertEqual(len(result.removed), 1)
+        self.assertEqual(set(manifest.task_ids()), ids)
+        self.assertEqual(len(list((self.root / "tasks" / "tasks").glob("*"))), 3)
+
+    def test_changed_file(self):
+        manifest = self.manifest()
+        manifest.refresh(self.files())
+        before = dict(manifest.files)
+        write_groove(self.files()[0], 64)
+        result = manifest.refresh(self.files())
+        self.assertEqual(result.changed, [str(self.files()[0])])
+        self.assertEqual(len(result.unchanged), 2)
+        for key in result.unchanged:
+            self.assertEqual(manifest.files[key]["tasks"], before[key]["tasks"])
+
+    def test_deterministic_and_isolated(self):
+        random.seed(1)
+        expected = random.random()
+        random.seed(1)
+        manifest = self.manifest()
+        manifest.refresh(self.files())
+        ids = manifest.task_ids()
+        self.assertEqual(random.random(), expected)
+
+        # Same content in a fresh manifest gives the same ids
+        other = DatasetManifest(self.root / "other", min_beats=4, max_beats=8)
+        other.refresh(self.files())
+        self.assertEqual(other.task_ids(), ids)
+
+    def test_params_change_rebuilds(self):
+        self.manifest().refresh(self.files())
+        manifest = self.manifest(hole_length=2)
+        self.assertEqual(manifest.files, {})
+        result = manifest.refresh(self.files())
+        self.assertEqual(len(result.added), 3)
+        self.assertTrue(all(t.hole_length == 2 for t in manifest.tasks()))
+
+
+if __name__ == "__main__":
+    unittest.main()
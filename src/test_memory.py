@@ -0,0 +1,76 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from dataset import generate_tasks_from_tracks, iter_tasks
+from drum_lang import parse_track_from_drum_lang
+from memory import MemoryBudget, SpillList
+from test_helpers_midi import write_groove
+from train import train_bounded
+
+
+class TestMemory(unittest.TestCase):
+    def test_spill_list_round_trip(self):
+        with MemoryBudget(0, check_every=1) as budget:
+            items = SpillList(budget, batch_size=4)
+            for i in range(10):
+                items.append({"i": i})
+            self.assertEqual(len(items.files), 2)
+            self.assertEqual(len(items.buffer), 2)
+            self.assertEqual([item["i"] for item in items], list(range(10)))
+            self.assertEqual(len(items), 10)
+            directory = items.directory
+            items.close()
+            self.assertFalse(directory.exists())
+
+    def test_no_spill_under_budget(self):
+        with MemoryBudget(2**40, check_every=1) as budget:
+            with SpillList(budget, batch_size=2) as items:
+                for i in range(10):
+                    items.append(i)
+                self.assertEqual(items.files, [])
+
+    def test_phase_peaks(self):
+        with MemoryBudget(2**30) as budget:
+            with budget.phase("allocate"):
+                data = bytearray(4 * 2**20)
+            del data
+            with budget.phase("idle"):
+                pass
+            report = budget.report()
+        self.assertGreaterEqual(report["allocate"], 4 * 2**20)
+        self.assertLess(report["idle"], report["allocate"])
+
+    def test_iter_tasks_matches_generate_tasks(self):
+        track = parse_track_from_drum_lang("BS4hH8BS4h8" * 8)
+        random.seed(3)
+        expected = generate_tasks_from_tracks([track], 1000)
+        random.seed(3)
+        streamed = list(iter_tasks(iter([track])))
+        self.assertEqual(
+            [t.task_signature for t in streamed],
+            [t.task_signature for t in expected],
+        )
+
+    def test_train_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                write_groove(Path(tmp) / f"groove_{i}.mid", 16 + 4 * i)
+            tab_files = sorted(Path(tmp).glob("*.mid"))
+            frontiers, report = train_bounded(
+                tab_files,
+                max_tasks=20,
+                memory_limit=0,
+                window_size=8,
+                spill_dir=Path(tmp) / "spill",
+                spill_batch_size=4,
+            )
+            self.assertEqual(set(report), {"generate_tasks", "wake"})
+            self.assertTrue(frontiers.files)
+            solved = [sig for sig, tracks in frontiers if tracks]
+            self.assertTrue(solved)
+            frontiers.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
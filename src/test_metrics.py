@@ -0,0 +1,54 @@
+import json
+import unittest
+from dataset import InfillTask
+from drum_lang import parse_primitives_from_drum_lang
+from generator import generate_tracks
+from grammar import Grammar
+from metrics import NULL_METRICS, Metrics
+from primitives import drum_lang_primitives
+
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        NULL_METRICS.inc("a")
+        NULL_METRICS.observe("b", 1.0)
+        with NULL_METRICS.phase("c"):
+            pass
+        self.assertEqual(
+            NULL_METRICS.to_dict(), {"counters": {}, "gauges": {}, "histograms": {}}
+        )
+
+    def test_histogram_and_exports(self):
+        metrics = Metrics()
+        metrics.inc("programs_total", 3)
+        metrics.set("programs_per_second", 10.0)
+        for value in (0.5, 5, 50000):
+            metrics.observe("candidates_per_task", value)
+        with metrics.phase("wake"):
+            pass
+
+        data = json.loads(metrics.to_json())
+        histogram = data["histograms"]["candidates_per_task"]
+        self.assertEqual(histogram["count"], 3)
+        self.assertEqual(histogram["max"], 50000)
+        self.assertEqual(histogram["buckets"]["+Inf"], 1)
+        self.assertIn("phase_wake_seconds", data["histograms"])
+
+        text = metrics.to_prometheus()
+        self.assertIn("drumcoder_programs_total 3", text)
+        self.assertIn('drumcoder_candidates_per_task_bucket{le="+Inf"} 3', text)
+        self.assertIn("drumcoder_candidates_per_task_count 3", text)
+
+    def test_generate_tracks_records(self):
+        metrics = Metrics()
+        track = parse_primitives_from_drum_lang("S3h3B3h3S3")
+        task = InfillTask(original_track=track, hole_start=2, hole_length=1)
+        grammar = Grammar.uniform(drum_lang_primitives)
+        generate_tracks(grammar, [task], metrics=metrics)
+        self.assertEqual(metrics.counters["tasks_solved"], 1)
+        self.assertGreater(metrics.counters["programs_total"], 0)
+        self.assertIn("time_to_first_solution_seconds", metrics.histograms)
+
+
+if __name__ == "__main__":
+    unittest.main()
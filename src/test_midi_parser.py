@@ -0,0 +1,60 @@
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from dataset import init_drum_dataset, load_tracks
+from midi_parser import parse_playable_track_from_midi, split_length
+from primitives import DOTTED_QUARTER, EIGHTH, WHOLE
+from test_helpers_midi import TPQ, chunk
+
+
+def write_midi(path: Path):
+    tempo = chunk(b"MTrk", [(0, b"\xff\x51\x03" + (600000).to_bytes(3, "big"))])
+    drums = chunk(
+        b"MTrk",
+        [
+            # kick + closed hat on beat 1, the hat using running status
+            (0, bytes([0x99, 36, 100])),
+            (0, bytes([42, 90])),
+            # a piano note on channel 1 is ignored
+            (0, bytes([0x90, 60, 100])),
+            # snare slightly late on the 8th note, quantized onto the grid
+            (TPQ // 2 + 3, bytes([0x99, 38, 100])),
+            # note-off as note-on with zero velocity is not an onset
+            (10, bytes([0x99, 38, 0])),
+            # hat on beat 3 after a dotted quarter gap
+            (TPQ * 3 // 2 - 13, bytes([0x99, 42, 80])),
+        ],
+    )
+    header = b"MThd" + struct.pack(">IHHH", 6, 1, 2, TPQ)
+    path.write_bytes(header + tempo + drums)
+
+
+class TestMidiParser(unittest.TestCase):
+    def test_split_length(self):
+        self.assertEqual(split_length(24), [DOTTED_QUARTER])
+        self.assertEqual(split_length(72), [WHOLE, EIGHTH])
+
+    def test_parse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "groove.mid"
+            write_midi(path)
+            track = parse_playable_track_from_midi(path)
+            self.assertEqual(track.bpm, 100)
+            self.assertEqual(track.to_drum_lang_sequence(), "Bh3S6h7")
+
+            self.assertEqual(init_drum_dataset(tmp), [path])
+            self.assertEqual(
+                load_tracks([path])[0].to_drum_lang_sequence(), "Bh3S6h7"
+            )
+
+    def test_not_midi(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bad.mid"
+            path.write_bytes(b"RIFF....")
+            with self.assertRaises(ValueError):
+                parse_playable_track_from_midi(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import time
+import unittest
+from drum_lang import parse_track_from_drum_lang
+from scheduler import PlaybackScheduler, beat_offsets
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, beat):
+        self.events.append((time.monotonic(), beat))
+
+
+class TestScheduler(unittest.TestCase):
+    def make_track(self, beats: int = 16, bpm: int = 960):
+        # 16th notes at 960bpm are 15ms apart
+        track = parse_track_from_drum_lang("S1" * beats)
+        track.bpm = bpm
+        return track
+
+    def test_beat_offsets(self):
+        track = parse_track_from_drum_lang("S5H3B4")
+        self.assertEqual(beat_offsets(track), [0.0, 0.25, 0.375, 0.5625])
+
+    def test_plays_every_beat_on_timeline(self):
+        track = self.make_track()
+        recorder = Recorder()
+        scheduler = PlaybackScheduler(recorder)
+        start = time.monotonic()
+        scheduler.play(track)
+        self.assertEqual(len(recorder.events), 16)
+        self.assertEqual(scheduler.metrics.events, 16)
+        # The last onset is measured against the absolute timeline, so
+        # per-beat error does not accumulate
+        last_onset = recorder.events[-1][0] - start
+        self.assertAlmostEqual(last_onset, 15 * 0.015, delta=0.02)
+
+    def test_stop(self):
+        track = self.make_track(beats=64, bpm=240)
+        recorder = Recorder()
+        scheduler = PlaybackScheduler(recorder)
+        scheduler.play(track, blocking=False)
+        time.sleep(0.1)
+        scheduler.stop()
+        played = len(recorder.events)
+        self.assertLess(played, 64)
+        self.assertFalse(scheduler.playing)
+        time.sleep(0.1)
+        self.assertEqual(len(recorder.events), played)
+
+    def test_seek(self):
+        track = self.make_track(beats=8)
+        recorder = Recorder()
+        scheduler = PlaybackScheduler(recorder)
+        scheduler.play(track, blocking=False, start=4)
+        scheduler.wait()
+        self.assertEqual(len(recorder.events), 4)
+
+        recorder.events.clear()
+        scheduler.play(self.make_track(beats=200, bpm=240), blocking=False)
+        scheduler.seek(198)
+        scheduler.wait(timeout=1)
+        self.assertFalse(scheduler.playing)
+        self.assertLessEqual(len(recorder.events), 3)
+
+    def test_set_bpm(self):
+        track = self.make_track(beats=8, bpm=60)
+        recorder = Recorder()
+        scheduler = PlaybackScheduler(recorder)
+        start = time.monotonic()
+        scheduler.play(track, blocking=False)
+        scheduler.set_bpm(960)
+        scheduler.wait(timeout=2)
+        self.assertEqual(len(recorder.events), 8)
+        self.assertLess(recorder.events[-1][0] - start, 0.5)
+        with self.assertRaises(ValueError):
+            scheduler.set_bpm(0)
+
+    def test_slower_tempo_inside_lookahead_does_not_spin(self):
+        # Beats 15ms apart, so the next one is always inside the lookahead
+        track = self.make_track(beats=8)
+        scheduler = PlaybackScheduler(Recorder())
+        scheduler.play(track, blocking=False)
+        time.sleep(0.005)
+        scheduler.set_bpm(2)
+        time.sleep(0.02)
+        start = time.monotonic()
+        scheduler.stop()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import unittest
+from drum_lang import parse_primitives_from_drum_lang, parse_track_from_drum_lang
+from grammar import ContextualGrammar
+from primitives import drum_lang_primitives
+from server import InfillClient, InfillEngine, InfillServer, LatencyTracker
+
+
+class TestInfillEngine(unittest.TestCase):
+    def setUp(self):
+        track = parse_primitives_from_drum_lang("BS3h3" * 20)
+        grammar = ContextualGrammar.from_tracks(drum_lang_primitives, [track])
+        self.engine = InfillEngine(grammar).warm()
+
+    def test_ranked_fills(self):
+        fills = self.engine.infill("BS3h3BS3?3", top_k=3)
+        self.assertEqual(fills[0]["fill"], "h")
+        self.assertEqual(fills[0]["track"], "BS3h3BS3h3")
+        mdls = [f["mdl"] for f in fills]
+        self.assertEqual(mdls, sorted(mdls))
+
+    def test_fills_are_valid(self):
+        for query in ("BS3????h3", "?5", "BS?", "BS3h3??"):
+            fills = self.engine.infill(query, top_k=5)
+            self.assertEqual(len(fills), 5)
+            for fill in fills:
+                parse_track_from_drum_lang(fill["track"])
+                self.assertEqual(len(fill["fill"]), query.count("?"))
+
+    def test_no_repeated_hits(self):
+        # The fill shares its beat with the suffix's hi-hat
+        for fill in self.engine.infill("?h3", top_k=10):
+            self.assertNotIn("h", fill["fill"])
+        # Returned tracks are canonical, hits in registry order
+        for fill in self.engine.infill("hS?3", top_k=10):
+            track = parse_track_from_drum_lang(fill["track"])
+            self.assertEqual(track.to_drum_lang_sequence(), fill["track"])
+
+    def test_invalid_queries(self):
+        for query in ("BS3h3", "B?S?3", "BSx?3", "BSBSB?3"):
+            with self.assertRaises(ValueError):
+                self.engine.infill(query)
+
+    def test_latency_tracker(self):
+        tracker = LatencyTracker()
+        for ms in range(1, 101):
+            tracker.observe(ms / 1000)
+        self.assertEqual(tracker.percentile(50), 0.05)
+        self.assertEqual(tracker.percentile(99), 0.099)
+
+
+class TestInfillServer(unittest.TestCase):
+    def setUp(self):
+        self.server = InfillServer(InfillEngine()).start()
+        self.client = InfillClient(self.server.address)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+
+    def test_infill(self):
+        fills = self.client.infill("BS3?h3", top_k=2)
+        self.assertEqual(len(fills), 2)
+        self.assertTrue(all(f["track"].startswith("BS3") for f in fills))
+        with self.assertRaises(ValueError):
+            self.client.infill("BS3h3")
+        # The connection is still usable after an error
+        self.assertEqual(len(self.client.infill("BS3??h3", top_k=1)), 1)
+
+    def test_concurrent_requests_are_batched(self):
+        errors = []
+
+        def worker(i):
+            client = InfillClient(self.server.address)
+            try:
+                for j in range(20):
+                    query = "BS3h3" * (i % 3 + 1) + "?" * (j % 3 + 1) + "h3"
+                    if not client.infill(query):
+                        errors.append(query)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        stats = self.client.stats()
+        self.assertEqual(stats["count"], 160)
+
+    def test_latency(self):
+        for i in range(200):
+            self.client.infill("BS3hH3" * (i % 4 + 1) + "??h3")
+        stats = self.client.stats()
+        self.assertEqual(stats["count"], 200)
+        self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertLess(stats["p50_ms"], 10)
+
+
+class TestUnixSocket(unittest.TestCase):
+    def test_infill(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "infill.sock")
+            server = InfillServer(InfillEngine(), path).start()
+            client = InfillClient(path)
+            try:
+                self.assertEqual(len(client.infill("BS3?h3", top_k=3)), 3)
+                self.assertEqual(client.stats()["count"], 1)
+            finally:
+                client.close()
+                server.shutdown()
+            self.assertFalse(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
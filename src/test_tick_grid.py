@@ -0,0 +1,78 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from dataset import _iter_segments, generate_tasks_from_tracks
+from drum_lang import parse_primitives_from_drum_lang, parse_track_from_drum_lang
+from metrics import NULL_METRICS
+from midi_parser import parse_playable_track_from_midi
+from primitives import TickGrid, measure_starts_from_onsets
+from test_helpers_midi import write_groove
+
+
+class TestTickGrid(unittest.TestCase):
+    def test_onsets(self):
+        # quarter, eighth, dotted eighth
+        grid = parse_track_from_drum_lang("S5H3B4").tick_grid()
+        self.assertEqual(list(grid.onsets), [0, 16, 24, 36])
+        self.assertEqual(len(grid), 3)
+        self.assertEqual(grid.total_ticks, 36)
+
+    def test_lookups(self):
+        grid = parse_track_from_drum_lang("S5H3B4").tick_grid()
+        ticks = (0, 15, 16, 30, 36)
+        self.assertEqual([grid.beat_at(t) for t in ticks], [0, 0, 1, 2, 3])
+        # 120 bpm: a whole note lasts 2 seconds
+        self.assertEqual(grid.seconds(1, 120), 0.5)
+        self.assertEqual(grid.beat_at_time(0.75, 120), 2)
+
+    def test_inferred_measures(self):
+        # Four quarters, a half note, then quarters into the third bar
+        track = parse_track_from_drum_lang("S5S5S5S5B7S5S5S5")
+        grid = track.tick_grid()
+        self.assertEqual(list(grid.measure_starts), [0, 4, 7])
+        self.assertEqual(grid.measure_of(5), 1)
+        self.assertEqual(grid.next_measure_start(5), 7)
+        self.assertEqual(grid.next_measure_start(8), 8)
+        # 3/4 bars
+        self.assertEqual(
+            list(measure_starts_from_onsets(grid.onsets, 48)), [0, 3, 5]
+        )
+
+    def test_explicit_measures(self):
+        track = parse_track_from_drum_lang("S5S5S5S5S5S5")
+        track.measure_starts = [0, 3]
+        self.assertEqual(list(TickGrid.from_track(track).measure_starts), [0, 3])
+        self.assertEqual(track.from_slice(2, 6).measure_starts, [1])
+
+    def test_midi_measures(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "groove.mid"
+            write_groove(path, 10)
+            track = parse_playable_track_from_midi(path)
+        self.assertEqual(track.measure_starts, [0, 4, 8])
+
+    def test_measure_aligned_segments(self):
+        track = parse_track_from_drum_lang("BS3hH3" * 64)
+        track.measure_starts = list(range(0, 128, 8))
+        random.seed(0)
+        segments = _iter_segments([track], 5, 11, NULL_METRICS, align_measures=True)
+        lengths = []
+        for segment, _ in segments:
+            code = "".join(p.drum_lang_code for p in segment)
+            lengths.append(len(parse_track_from_drum_lang(code)))
+        self.assertTrue(lengths)
+        self.assertTrue(all(length % 8 == 0 for length in lengths))
+
+        random.seed(0)
+        tasks = generate_tasks_from_tracks([track], 10, 5, 11, align_measures=True)
+        for task in tasks:
+            flat = parse_primitives_from_drum_lang(
+                task.to_drum_lang_string(with_hole=False)
+            )
+            code = "".join(p.drum_lang_code for p in flat)
+            self.assertEqual(len(parse_track_from_drum_lang(code)) % 8, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,26 +1,44 @@
-from typing import List
+import argparse
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from cache import EnumerationCache
 from grammar import Grammar
 from primitives import drum_lang_primitives
 from generator import generate_tracks
-from dataset import generate_tasks, init_drum_dataset
+from dataset import generate_tasks, init_drum_dataset, iter_tasks, iter_tracks
 from dataset import InfillTask
+from memory import MemoryBudget, SpillList
+from metrics import NULL_METRICS, Metrics
 
 # TODO: shared grammar vs task-specific grammars?
 # TODO: run programs over all tasks or per task?
 # TODO: support larger holes for infilling
 
 
-def train(tasks: List[InfillTask], num_sleep_wake_cycles: int = 1):
+def train(
+    tasks: List[InfillTask],
+    num_sleep_wake_cycles: int = 1,
+    metrics: Metrics = NULL_METRICS,
+):
     # instantiate a grammar with uniform probabilities across all primitives
     grammar = Grammar.uniform(drum_lang_primitives)
+    # enumerations are reused across groups and cycles while the grammar holds
+    cache = EnumerationCache(metrics=metrics)
     for _ in range(num_sleep_wake_cycles):
 
         # generate programs with no neural guidance
-        tracks = wake(grammar, tasks)
+        with metrics.phase("wake"):
+            tracks = wake(grammar, tasks, metrics=metrics, cache=cache)
         print(f"Generated {len(tracks)} tracks")
 
 
-def wake(grammar: Grammar, tasks: List[InfillTask]):
+def wake(
+    grammar: Grammar,
+    tasks: List[InfillTask],
+    metrics: Metrics = NULL_METRICS,
+    cache: Optional[EnumerationCache] = None,
+):
     # Bin the tasks by request type and grammar
     # If these are the same then we can generate tracks for multiple tasks simultaneously
     grouped_tasks = {}
@@ -32,12 +50,71 @@ def wake(grammar: Grammar, tasks: List[InfillTask]):
 
     # Generate tracks for each group of tasks separately
     all_tracks = {}
+    metrics.inc("wake_groups", len(grouped_tasks))
     for tasks in grouped_tasks.values():
-        tracks = generate_tracks(grammar, tasks)
-        all_tracks.extend(tracks)
+        tracks = generate_tracks(grammar, tasks, metrics=metrics, cache=cache)
+        all_tracks.update(tracks)
     return all_tracks
 
 
+def _windows(tasks: Iterable[InfillTask], size: int) -> Iterator[List[InfillTask]]:
+    window = []
+    for task in tasks:
+        window.append(task)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def train_bounded(
+    tab_files: Iterable[Path],
+    max_tasks: Optional[int] = None,
+    memory_limit: int = 512 * 2**20,
+    window_size: int = 256,
+    spill_dir: Optional[Path] = None,
+    spill_batch_size: int = 1024,
+    metrics: Metrics = NULL_METRICS,
+) -> Tuple[SpillList, Dict[str, int]]:
+    """Memory-bounded generate_tasks + wake for corpora that do not fit in RAM.
+
+    Tracks are streamed one file at a time and dropped once segmented. Tasks
+    and frontiers are spilled to `spill_dir` in batches of `spill_batch_size`
+    whenever traced memory exceeds `memory_limit` bytes, and wake runs over
+    windows of `window_size` tasks.
+    Returns the frontiers as (task signature, solutions) pairs, to be closed
+    by the caller, and the peak traced memory of each phase.
+    """
+    grammar = Grammar.uniform(drum_lang_primitives)
+    cache = EnumerationCache(metrics=metrics)
+    budget = MemoryBudget(memory_limit, metrics=metrics)
+    with budget:
+        tasks = SpillList(budget, spill_dir, spill_batch_size)
+        frontiers = SpillList(budget, spill_dir, spill_batch_size)
+        try:
+            with budget.phase("generate_tasks"), metrics.phase("generate_tasks"):
+                stream = iter_tasks(iter_tracks(tab_files), metrics=metrics)
+                for task in islice(stream, max_tasks):
+                    tasks.append(task)
+            print(f"Generated {len(tasks)} tasks")
+
+            with budget.phase("wake"), metrics.phase("wake"):
+                for window in _windows(tasks, window_size):
+                    tracks = wake(grammar, window, metrics=metrics, cache=cache)
+                    for item in tracks.items():
+                        frontiers.append(item)
+        except BaseException:
+            frontiers.close()
+            raise
+        finally:
+            tasks.close()
+
+    for phase, peak in budget.report().items():
+        print(f"Peak memory during {phase}: {peak / 2**20:.1f} MiB")
+    return frontiers, budget.report()
+
+
 def sleep(grammar):
     pass
 
@@ -47,6 +124,32 @@ def consolidate():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train on the drum dataset")
+    parser.add_argument("--max-tasks", type=int, default=50)
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        help="Memory budget in MiB, streams and spills to disk when set",
+    )
+    parser.add_argument("--window-size", type=int, default=256)
+    parser.add_argument("--spill-dir", type=Path)
+    args = parser.parse_args()
+
+    metrics = Metrics()
     tab_files = init_drum_dataset()
-    tasks = generate_tasks(tab_files, 50)
-    train(tasks)
+    if args.memory_limit is None:
+        tasks = generate_tasks(tab_files, args.max_tasks, metrics=metrics)
+        train(tasks, metrics=metrics)
+    else:
+        frontiers, _ = train_bounded(
+            tab_files,
+            args.max_tasks,
+            memory_limit=args.memory_limit * 2**20,
+            window_size=args.window_size,
+            spill_dir=args.spill_dir,
+            metrics=metrics,
+        )
+        solved = sum(1 for _, tracks in frontiers if tracks)
+        print(f"Solved {solved} of {len(frontiers)} tasks")
+        frontiers.close()
+    print(metrics.to_json(indent=2))